@@ -0,0 +1,222 @@
+import re
+import threading
+from datetime import datetime
+import metrics
+from extraction import iter_pdf_pages
+from skills import get_skill_matcher
+
+# Bump whenever extraction, skills or scoring change, so analyses cached
+# under the old version are recomputed and reanalyze.py updates stored ones
+ANALYZER_VERSION = 3
+# Oldest analyzer version whose extracted text is still valid. Set it to
+# ANALYZER_VERSION when PDF text extraction itself changes; until then
+# reanalyze.py re-scores the stored text instead of re-reading the PDFs
+TEXT_VERSION = 3
+
+# Extraction budgets: pages past either limit are never parsed
+MAX_PAGES = 20
+MAX_CHARS = 100000
+
+EMAIL_PATTERN = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+PHONE_PATTERN = re.compile(r'[\+]?[1-9]?[0-9]{7,15}')
+# Every phone number contains a run of 7 digits starting at most 2 characters in
+DIGIT_RUN_PATTERN = re.compile(r'[0-9]{7}')
+
+# A line mentioning any of these starts capturing the lines after it as experience
+EXPERIENCE_KEYWORDS = ['experience', 'work', 'employment', 'career', 'position', 'job', 'role']
+EXPERIENCE_PATTERN = re.compile('|'.join(EXPERIENCE_KEYWORDS))  # Matched against lowercased text
+MAX_EXPERIENCE = 5
+
+class CVAnalyzer:
+    def __init__(self, max_pages=MAX_PAGES, max_chars=MAX_CHARS):
+        self.skill_matcher = get_skill_matcher()
+        self.skills_keywords = self.skill_matcher.skills
+        self.max_pages = max_pages
+        self.max_chars = max_chars
+        
+    def iter_pdf_pages(self, pdf_path):
+        """Yield the text of each PDF page, stopping at the page and character budgets.
+        
+        Raises ExtractionError when the PDF cannot be read."""
+        return iter_pdf_pages(pdf_path, self.max_pages, self.max_chars)
+    
+    def extract_text_from_pdf(self, pdf_path):
+        """Extract text from PDF file"""
+        return ''.join(self.iter_pdf_pages(pdf_path))
+    
+    def extract_contact_info(self, text):
+        """Extract contact information from CV text"""
+        contact = {'email': None, 'phone': None}
+        self.update_contact_info(contact, text)
+        return contact
+    
+    def update_contact_info(self, contact, text):
+        """Fill in whichever contact fields are still missing from the next chunk of text"""
+        # The patterns are only run from just before the first place they could
+        # match, which is much cheaper than letting them try every position
+        if not contact['email']:
+            at = text.find('@')
+            if at >= 0:
+                start = max(text.rfind(' ', 0, at), text.rfind('\n', 0, at)) + 1
+                email = EMAIL_PATTERN.search(text, start)
+                contact['email'] = email.group() if email else None
+        if not contact['phone']:
+            digits = DIGIT_RUN_PATTERN.search(text)
+            if digits:
+                phone = PHONE_PATTERN.search(text, max(digits.start() - 2, 0))
+                contact['phone'] = phone.group() if phone else None
+    
+    def extract_skills(self, text):
+        """Extract skills from CV text"""
+        return self.skill_matcher.extract(text)
+    
+    def update_skills(self, skills, text):
+        """Append skills from the next chunk of text that were not seen yet"""
+        for skill in self.skill_matcher.extract(text):
+            if skill not in skills:
+                skills.append(skill)
+    
+    def find_skill_matches(self, text):
+        """Return (skill, start, end) for every skill mention in CV text"""
+        return list(self.skill_matcher.find(text))
+    
+    def extract_experience(self, text):
+        """Extract work experience information"""
+        experience_sections = []
+        self.update_experience(experience_sections, text, False)
+        return experience_sections
+    
+    def update_experience(self, experience_sections, text, capture_next):
+        """Scan the next chunk of text for experience lines.
+        
+        Returns the capture state to pass in with the following chunk."""
+        if len(experience_sections) >= MAX_EXPERIENCE:
+            return capture_next
+        
+        lines = text.split('\n')
+        start = 0
+        if not capture_next:
+            # Nothing is captured before the first keyword line, so jump straight past it
+            lowered = text.lower()
+            keyword = EXPERIENCE_PATTERN.search(lowered)
+            if not keyword:
+                return False
+            start = lowered.count('\n', 0, keyword.start()) + 1
+            capture_next = True
+        
+        for line in lines[start:]:
+            entry = line.strip()
+            if len(entry) > 10 and not EXPERIENCE_PATTERN.search(entry.lower()):  # Reasonable length for experience entry
+                experience_sections.append(entry)
+                if len(experience_sections) >= MAX_EXPERIENCE:
+                    break
+        
+        return capture_next
+    
+    def calculate_score(self, analysis_result):
+        """Calculate CV score based on various factors"""
+        score = 0
+        
+        # Contact information (20 points)
+        if analysis_result['contact']['email']:
+            score += 10
+        if analysis_result['contact']['phone']:
+            score += 10
+        
+        # Skills (40 points)
+        skills_count = len(analysis_result['skills'])
+        score += min(skills_count * 4, 40)
+        
+        # Experience (25 points)
+        exp_count = len(analysis_result['experience'])
+        score += min(exp_count * 5, 25)
+        
+        # Text quality (15 points)
+        text_length = analysis_result['text_length']
+        if text_length > 1000:
+            score += 15
+        elif text_length > 500:
+            score += 12
+        elif text_length > 200:
+            score += 8
+        elif text_length > 100:
+            score += 5
+        
+        return min(score, 100)  # Cap at 100
+    
+    def generate_recommendations(self, analysis_result):
+        """Generate improvement recommendations"""
+        recommendations = []
+        
+        if not analysis_result['contact']['email']:
+            recommendations.append("Add a professional email address")
+        
+        if not analysis_result['contact']['phone']:
+            recommendations.append("Include your phone number")
+        
+        if len(analysis_result['skills']) < 5:
+            recommendations.append("Add more relevant technical skills")
+        
+        if len(analysis_result['experience']) < 2:
+            recommendations.append("Include more detailed professional experience")
+        
+        if analysis_result['text_length'] < 500:
+            recommendations.append("Expand your CV with more detailed information")
+        
+        if len(analysis_result['skills']) > 10:
+            recommendations.append("Excellent! Your CV shows great skill diversity")
+        
+        if not recommendations:
+            recommendations.append("Excellent CV! Consider adding quantified achievements")
+        
+        return recommendations
+    
+    def analyze_text(self, pages):
+        """Analyze CV text given as an iterable of page texts.
+        
+        Contact details, skills and experience are collected together in one
+        pass over each page as it arrives."""
+        texts = []
+        contact = {'email': None, 'phone': None}
+        skills = []
+        experience = []
+        capture_experience = False
+        
+        for page_text in pages:
+            texts.append(page_text)
+            self.update_contact_info(contact, page_text)
+            self.update_skills(skills, page_text)
+            capture_experience = self.update_experience(experience, page_text, capture_experience)
+        
+        text = ''.join(texts)
+        analysis = {
+            'raw_text': text,
+            'text_length': len(text),
+            'contact': contact,
+            'skills': skills,
+            'experience': experience,
+            'page_count': len(texts),
+            'timestamp': datetime.now().isoformat()
+        }
+        
+        analysis['score'] = self.calculate_score(analysis)
+        analysis['recommendations'] = self.generate_recommendations(analysis)
+        
+        return analysis
+    
+    def analyze_cv(self, pdf_path):
+        """Main analysis function"""
+        return self.analyze_text(self.iter_pdf_pages(pdf_path))
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+def get_analyzer():
+    """Return the analyzer shared by every request and worker in this process"""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = CVAnalyzer()
+            if metrics.enabled:
+                metrics.instrument_analyzer(_analyzer)
+        return _analyzer
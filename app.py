@@ -1,194 +1,422 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_file, g, Response, stream_with_context, abort
 from werkzeug.utils import secure_filename
 import os
-import PyPDF2
 import json
+import hashlib
+import base64
+import functools
+import itertools
 from datetime import datetime
-import sqlite3
 import re
-from textblob import TextBlob
-import nltk
-from collections import Counter
+import threading
+import time
+import zipfile
+import metrics
+from analyzer import ANALYZER_VERSION, get_analyzer
+from extraction import ExtractionError
+from reports import ReportCache, report_version
+from skill_index import bitmap, get_skill_index, membership
+from responses import choose_encoding, compress_response, json_provider, parse_fields, select_fields
+from storage import FileTooLarge, store_upload
+from database import pool, connect, init_db, requeue_interrupted_jobs, index_cv, index_cvs, save_analysis, get_cached_analysis, cache_analysis, analysis_json
 
 app = Flask(__name__)
+app.json = json_provider(app)  # orjson when installed
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = 'uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
-
-# Ensure upload directory exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-class CVAnalyzer:
-    def __init__(self):
-        self.skills_keywords = [
-            'python', 'java', 'javascript', 'html', 'css', 'react', 'node.js',
-            'sql', 'mysql', 'postgresql', 'mongodb', 'git', 'docker', 'kubernetes',
-            'aws', 'azure', 'machine learning', 'data science', 'artificial intelligence',
-            'project management', 'leadership', 'communication', 'teamwork', 'angular',
-            'vue.js', 'php', 'c++', 'c#', '.net', 'spring', 'django', 'flask',
-            'tensorflow', 'pytorch', 'pandas', 'numpy', 'scikit-learn', 'tableau',
-            'power bi', 'excel', 'photoshop', 'illustrator', 'figma', 'sketch'
-        ]
-        
-    def extract_text_from_pdf(self, pdf_path):
-        """Extract text from PDF file"""
+app.config['MAX_CV_SIZE'] = 16 * 1024 * 1024  # 16MB max size per CV
+app.config['MAX_CONTENT_LENGTH'] = 256 * 1024 * 1024  # 256MB max request (batch uploads)
+app.config['MAX_BATCH_FILES'] = 500  # CVs accepted per batch upload
+app.config['BATCH_WORKERS'] = os.cpu_count()  # Batch upload files analyzed at once
+app.config['ASYNC_ANALYSIS'] = False  # Default mode for /api/upload
+app.config['ANALYSIS_WORKERS'] = 2  # Background analysis threads
+# PDF text is extracted in separate worker processes (0 extracts in-process).
+# EXTRACTION_WORKERS is for the whole host and is split between the app
+# processes serving it; gunicorn sets WEB_CONCURRENCY, run.py sets APP_PROCESSES
+app.config['EXTRACTION_WORKERS'] = os.cpu_count()
+app.config['APP_PROCESSES'] = int(os.environ.get('WEB_CONCURRENCY', 1))
+app.config['EXTRACTION_TIMEOUT'] = 30  # Seconds per PDF before its worker is killed
+app.config['EXTRACTION_MEMORY_MB'] = 512  # Memory cap of each extraction worker
+app.config['EXTRACTION_MAX_JOBS'] = 100  # PDFs per extraction worker before it is replaced
+app.config['STATS_CACHE_TTL'] = 5  # Seconds /api/stats responses are reused
+app.config['SEARCH_PAGE_SIZE'] = 20  # Default and maximum /api/search page sizes
+app.config['SEARCH_MAX_PAGE_SIZE'] = 100
+app.config['SEARCH_COUNT_LIMIT'] = 1000  # Text matches counted before the total is an estimate
+app.config['MATCH_MAX_RESULTS'] = 50  # Largest limit accepted by /api/match
+app.config['REPORT_CACHE_FOLDER'] = 'report_cache'  # Rendered /api/report pages
+app.config['COMPRESS_RESPONSES'] = True  # gzip/brotli JSON responses clients accept
+app.config['COMPRESS_MIN_SIZE'] = 1024  # Smaller bodies are sent uncompressed
+# Stage timings, /metrics and request log lines; set CV_METRICS=0 to leave
+# the code uninstrumented
+app.config['METRICS_ENABLED'] = os.environ.get('CV_METRICS', '1') != '0'
+
+# Background analysis queue
+_job_available = threading.Event()
+_workers_lock = threading.Lock()
+_workers = []
+
+def claim_next_job():
+    """Atomically mark the oldest pending job as running and return it"""
+    conn = pool.acquire()
+    c = conn.cursor()
+    try:
+        while True:
+            c.execute("SELECT id, cv_id, file_path FROM analysis_jobs WHERE status = 'pending' ORDER BY id LIMIT 1")
+            job = c.fetchone()
+            if not job:
+                return None
+            
+            # Another worker may have claimed it between the SELECT and here
+            c.execute("""UPDATE analysis_jobs SET status = 'running', updated_at = CURRENT_TIMESTAMP
+                         WHERE id = ? AND status = 'pending'""", (job[0],))
+            conn.commit()
+            if c.rowcount == 1:
+                return job
+    finally:
+        pool.release(conn)
+
+def finish_job(job_id, cv_id, analysis=None, error=None, error_code=None):
+    """Record a job's outcome, writing the analysis to its CV row on success"""
+    conn = pool.acquire()
+    c = conn.cursor()
+    try:
+        if analysis is not None:
+            save_analysis(c, cv_id, analysis)
+            c.execute("SELECT content_hash FROM cvs WHERE id = ?", (cv_id,))
+            row = c.fetchone()
+            if row and row[0]:
+                cache_analysis(c, row[0], analysis)
+        
+        c.execute('''UPDATE analysis_jobs SET status = ?, error = ?, error_code = ?, updated_at = CURRENT_TIMESTAMP
+                     WHERE id = ?''', ('failed' if error else 'done', error, error_code, job_id))
+        
+        conn.commit()
+    finally:
+        pool.release(conn)
+
+def run_next_job():
+    """Claim, analyze and record one job; return False when the queue is empty"""
+    job = claim_next_job()
+    if not job:
+        return False
+    
+    job_id, cv_id, file_path = job
+    try:
         try:
-            with open(pdf_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in pdf_reader.pages:
-                    text += page.extract_text()
-                return text
+            analysis = analyze_upload(file_path)
+        except ExtractionError as e:
+            finish_job(job_id, cv_id, error=str(e), error_code=e.code)
         except Exception as e:
-            return f"Error extracting text: {str(e)}"
-    
-    def extract_contact_info(self, text):
-        """Extract contact information from CV text"""
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        phone_pattern = r'[\+]?[1-9]?[0-9]{7,15}'
-        
-        emails = re.findall(email_pattern, text)
-        phones = re.findall(phone_pattern, text)
-        
-        return {
-            'email': emails[0] if emails else None,
-            'phone': phones[0] if phones else None
-        }
-    
-    def extract_skills(self, text):
-        """Extract skills from CV text"""
-        text_lower = text.lower()
-        found_skills = []
-        
-        for skill in self.skills_keywords:
-            if skill.lower() in text_lower:
-                found_skills.append(skill)
-        
-        return found_skills
-    
-    def extract_experience(self, text):
-        """Extract work experience information"""
-        experience_keywords = ['experience', 'work', 'employment', 'career', 'position', 'job', 'role']
-        lines = text.split('\n')
-        
-        experience_sections = []
-        capture_next = False
-        
-        for line in lines:
-            line_lower = line.lower()
-            if any(keyword in line_lower for keyword in experience_keywords):
-                capture_next = True
-            elif capture_next and line.strip():
-                if len(line.strip()) > 10:  # Reasonable length for experience entry
-                    experience_sections.append(line.strip())
-                    if len(experience_sections) >= 5:  # Limit to 5 entries
-                        break
-        
-        return experience_sections
+            finish_job(job_id, cv_id, error=str(e))
+        else:
+            finish_job(job_id, cv_id, analysis=analysis)
+    except Exception as e:
+        # Recording the outcome failed, e.g. "database is locked": the job must
+        # not stay 'running' until the process restarts
+        app.logger.exception('Could not record the outcome of analysis job %s', job_id)
+        while True:
+            try:
+                finish_job(job_id, cv_id, error=f'Could not save the analysis: {e}')
+                break
+            except Exception:
+                app.logger.exception('Could not mark analysis job %s as failed; retrying', job_id)
+                time.sleep(1)
+    return True
+
+def analysis_worker():
+    """Run queued analyses until the process exits.
     
-    def calculate_score(self, analysis_result):
-        """Calculate CV score based on various factors"""
-        score = 0
-        
-        # Contact information (20 points)
-        if analysis_result['contact']['email']:
-            score += 10
-        if analysis_result['contact']['phone']:
-            score += 10
-        
-        # Skills (40 points)
-        skills_count = len(analysis_result['skills'])
-        score += min(skills_count * 4, 40)
-        
-        # Experience (25 points)
-        exp_count = len(analysis_result['experience'])
-        score += min(exp_count * 5, 25)
-        
-        # Text quality (15 points)
-        text_length = len(analysis_result['raw_text'])
-        if text_length > 1000:
-            score += 15
-        elif text_length > 500:
-            score += 12
-        elif text_length > 200:
-            score += 8
-        elif text_length > 100:
-            score += 5
-        
-        return min(score, 100)  # Cap at 100
+    Errors are logged and the thread carries on: start_analysis_workers()
+    never replaces a worker that died."""
+    while True:
+        try:
+            if run_next_job():
+                continue
+        except Exception:
+            # Claiming failed; nothing is left running
+            app.logger.exception('Could not claim an analysis job')
+            time.sleep(1)
+            continue
+        # Sleep until a new job is enqueued, polling in case another process added one
+        _job_available.wait(timeout=5)
+        _job_available.clear()
+
+def start_analysis_workers():
+    """Start the background analysis threads and the PDF extraction workers
+    once per process"""
+    with _workers_lock:
+        if _workers:
+            return
+        for i in range(app.config['ANALYSIS_WORKERS']):
+            worker = threading.Thread(target=analysis_worker, name=f'analysis-worker-{i}', daemon=True)
+            worker.start()
+            _workers.append(worker)
+    extraction_pool = get_extraction_pool()
+    if extraction_pool is not None:
+        extraction_pool.start()
+
+_analysis_pool = None
+_analysis_pool_lock = threading.Lock()
+
+def get_analysis_pool():
+    """Return the thread pool that analyzes batch uploads, starting it on first use.
     
-    def generate_recommendations(self, analysis_result):
-        """Generate improvement recommendations"""
-        recommendations = []
-        
-        if not analysis_result['contact']['email']:
-            recommendations.append("Add a professional email address")
-        
-        if not analysis_result['contact']['phone']:
-            recommendations.append("Include your phone number")
-        
-        if len(analysis_result['skills']) < 5:
-            recommendations.append("Add more relevant technical skills")
-        
-        if len(analysis_result['experience']) < 2:
-            recommendations.append("Include more detailed professional experience")
-        
-        if len(analysis_result['raw_text']) < 500:
-            recommendations.append("Expand your CV with more detailed information")
-        
-        if len(analysis_result['skills']) > 10:
-            recommendations.append("Excellent! Your CV shows great skill diversity")
-        
-        if not recommendations:
-            recommendations.append("Excellent CV! Consider adding quantified achievements")
-        
-        return recommendations
+    Threads are enough: the PDF parsing happens in the extraction workers."""
+    global _analysis_pool
+    with _analysis_pool_lock:
+        if _analysis_pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            _analysis_pool = ThreadPoolExecutor(max_workers=app.config['BATCH_WORKERS'])
+        return _analysis_pool
+
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+def get_extraction_pool():
+    """Return this process's PDF extraction workers, or None to extract in-process"""
+    global _extraction_pool
+    if not app.config['EXTRACTION_WORKERS']:
+        return None
+    with _extraction_pool_lock:
+        # A pool inherited through fork belongs to the parent; workers start their own
+        if _extraction_pool is None or _extraction_pool[0] != os.getpid():
+            from extraction import ExtractionPool
+            size = max(1, app.config['EXTRACTION_WORKERS'] // max(1, app.config['APP_PROCESSES']))
+            _extraction_pool = (os.getpid(), ExtractionPool(size,
+                                                            timeout=app.config['EXTRACTION_TIMEOUT'],
+                                                            memory_limit_mb=app.config['EXTRACTION_MEMORY_MB'],
+                                                            max_jobs=app.config['EXTRACTION_MAX_JOBS']))
+        return _extraction_pool[1]
+
+def analyze_upload(file_path):
+    """Analyze an uploaded PDF, extracting its text in an isolated worker.
     
-    def analyze_cv(self, pdf_path):
-        """Main analysis function"""
-        text = self.extract_text_from_pdf(pdf_path)
-        
-        analysis = {
-            'raw_text': text,
-            'contact': self.extract_contact_info(text),
-            'skills': self.extract_skills(text),
-            'experience': self.extract_experience(text),
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        analysis['score'] = self.calculate_score(analysis)
-        analysis['recommendations'] = self.generate_recommendations(analysis)
-        
-        return analysis
+    Raises ExtractionError when the text cannot be extracted."""
+    extraction_pool = get_extraction_pool()
+    if extraction_pool is None:
+        return get_analyzer().analyze_cv(file_path)
+    return get_analyzer().analyze_text(extraction_pool.extract(file_path))
 
-# Database setup
-def init_db():
-    conn = sqlite3.connect('cv_platform.db')
-    c = conn.cursor()
+def iter_batch_files(files):
+    """Yield (name, stream, error) for each PDF in the uploaded files and zip archives.
     
-    # Users table
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  name TEXT NOT NULL,
-                  email TEXT UNIQUE NOT NULL,
-                  user_type TEXT NOT NULL,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    A member is named by its path in the archive after the archive's name.
+    Archive members are read one at a time, never extracted as a whole. An
+    archive or member that cannot be opened is yielded with no stream and the
+    reason in error, and the files after it are still read."""
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            try:
+                archive = zipfile.ZipFile(file.stream)
+            except zipfile.BadZipFile as e:
+                yield file.filename, None, f'Invalid zip archive: {e}'
+                continue
+            with archive:
+                for member in archive.infolist():
+                    if member.is_dir() or not member.filename.lower().endswith('.pdf'):
+                        continue
+                    name = f'{file.filename}/{member.filename}'
+                    try:
+                        stream = archive.open(member)
+                    except (zipfile.BadZipFile, NotImplementedError, RuntimeError) as e:
+                        # Corrupt, encrypted or unsupported compression
+                        yield name, None, f'Cannot read from the zip archive: {e}'
+                        continue
+                    with stream:
+                        yield name, stream, None
+        else:
+            yield file.filename, file.stream, None
+
+def build_fts_query(search_query):
+    """Turn free text into an FTS5 prefix phrase query, or None if it has no terms"""
+    terms = re.findall(r'[\w+#]+', search_query.lower())
+    if not terms:
+        return None
+    return '"' + ' '.join(terms) + '"*'
+
+def encode_cursor(score, cv_id):
+    """Opaque token for the position after (score, id) in search order"""
+    return base64.urlsafe_b64encode(json.dumps([score, cv_id]).encode()).decode()
+
+def decode_cursor(cursor):
+    score, cv_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return int(score), int(cv_id)
+
+def get_db():
+    """Return the pooled connection for the current request"""
+    if 'db' not in g:
+        g.db = pool.acquire()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    conn = g.pop('db', None)
+    if conn is not None:
+        pool.release(conn)
+
+def query_db(query, args=(), one=False):
+    """Run a read query on the request's connection and return its rows"""
+    cur = get_db().execute(query, args)
+    rows = cur.fetchall()
+    cur.close()
+    return (rows[0] if rows else None) if one else rows
+
+def start_request_timing():
+    g.metrics_token = metrics.start_request(request.endpoint)
+
+def finish_request_timing(response):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        metrics.finish_request(token, request.method, request.path, response.status_code)
+    return response
+
+def abort_request_timing(exception):
+    # Requests that raised never reach after_request
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        metrics.finish_request(token, request.method, request.path, 500)
+
+def compress_json_response(response):
+    return compress_response(response, request.accept_encodings, app.config['COMPRESS_MIN_SIZE'])
+
+def requested_fields():
+    """Fields the client asked for with fields= (query, form or JSON body), or None for all"""
+    fields = request.values.get('fields')
+    if fields is None and request.is_json:
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            fields = body.get('fields')
+    return parse_fields(fields)
+
+def get_match_index():
+    """Return the job-description matching index (numpy is only imported here)"""
+    from matching import get_match_index
+    return get_match_index()
+
+def get_duplicate_index():
+    """Return the near-duplicate index (numpy is only imported here)"""
+    from dedup import get_duplicate_index
+    return get_duplicate_index()
+
+def find_duplicates(conn, cv_ids):
+    """Map each of cv_ids to its near-duplicates as [(id, similarity, score)]"""
+    duplicate_index = get_duplicate_index()
+    duplicate_index.refresh(conn)
+    return duplicate_index.duplicates(conn, cv_ids)
+
+def iter_fts_matches(fts_query, selected, after=None, min_score=0):
+    """Yield (score, cv_id) for the selected CVs matching an FTS5 query, best first.
     
-    # CVs table
-    c.execute('''CREATE TABLE IF NOT EXISTS cvs
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  filename TEXT NOT NULL,
-                  original_filename TEXT NOT NULL,
-                  analysis_result TEXT,
-                  uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                  FOREIGN KEY (user_id) REFERENCES users (id))''')
+    Walks idx_cvs_score in order and checks each CV against the matches, which
+    SQLite collects once without sorting them, so stopping after a page costs
+    far less than ordering every match. min_score only bounds the walk: the
+    bitmap must already exclude lower scores."""
+    if not selected:
+        return
+    sql = """SELECT id, score FROM cvs INDEXED BY idx_cvs_score
+             WHERE +id IN (SELECT rowid FROM cvs_fts WHERE cvs_fts MATCH ?)"""
+    params = [fts_query]
+    if min_score:
+        sql += " AND score >= ?"
+        params.append(min_score)
+    if after:
+        sql += " AND (score, id) < (?, ?)"
+        params.extend(after)
+    is_selected = membership(selected)
+    c = get_db().cursor()
+    try:
+        c.execute(sql + " ORDER BY score DESC, id DESC", params)
+        for rows in iter(lambda: c.fetchmany(256), []):
+            for cv_id, score in rows:
+                if is_selected(cv_id):
+                    yield score, cv_id
+    finally:
+        c.close()
+
+def fts_top(fts_query, selected, limit, after=None, min_score=0):
+    """Like SkillIndex.top, for the selected CVs that match an FTS5 query"""
+    matches = iter_fts_matches(fts_query, selected, after, min_score)
+    try:
+        return list(itertools.islice(matches, limit))
+    finally:
+        matches.close()
+
+def count_matches(matches, limit):
+    """Count what is left of an iterator, stopping past limit"""
+    try:
+        return sum(1 for _ in itertools.islice(matches, limit + 1))
+    finally:
+        matches.close()
+
+def top_distinct(top, selected, limit, after=None):
+    """Like top (SkillIndex.top or fts_top), but leaves out CVs with a
+    better-ranked near-duplicate among the selected ones. Returns the page
+    and, for each CV on it, the ids of the lower-ranked duplicates it stands for."""
+    page = []
+    collapsed = {}
+    while len(page) < limit:
+        batch = top(selected, limit - len(page), after)
+        if not batch:
+            break
+        duplicates = find_duplicates(get_db(), [cv_id for _, cv_id in batch])
+        for score, cv_id in batch:
+            copies = [(other_score, other) for other, _, other_score in duplicates.get(cv_id, ())
+                      if (selected >> other) & 1]
+            if any(copy > (score, cv_id) for copy in copies):
+                continue
+            page.append((score, cv_id))
+            collapsed[cv_id] = [other for _, other in copies]
+        after = batch[-1]
+    return page, collapsed
+
+_app_ready = False
+_app_ready_lock = threading.Lock()
+
+def create_app(config=None):
+    """Configure the app and prepare its storage, once per process.
     
-    conn.commit()
-    conn.close()
+    Importing this module has no side effects; run.py, gunicorn
+    ("app:create_app()") and the Flask CLI ("flask --app app:create_app run")
+    all start through here."""
+    global _app_ready
+    with _app_ready_lock:
+        if _app_ready:
+            return app
+        
+        if config:
+            app.config.update(config)
+        
+        if app.config['METRICS_ENABLED']:
+            metrics.enable()
+            app.before_request(start_request_timing)
+            app.after_request(finish_request_timing)
+            app.teardown_request(abort_request_timing)
+        
+        # Registered last so it runs first: request timings include compression
+        if app.config['COMPRESS_RESPONSES']:
+            app.after_request(compress_json_response)
+        
+        os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        init_db()
+        # Jobs left running by a previous run were interrupted, so retry them
+        requeue_interrupted_jobs()
+        _app_ready = True
+        return app
 
-# Initialize database
-init_db()
+def warm_up():
+    """Load what is otherwise loaded on first use: the analyzer, PyPDF2, the
+    match index and the skill index. Pre-forking servers call this so workers
+    share it, and so no worker builds the match index in the background."""
+    import PyPDF2
+    get_analyzer()
+    # A private connection, closed before any worker is forked: a pooled one
+    # would be inherited and shared by every worker
+    conn = connect()
+    try:
+        get_match_index().build(conn)
+        get_skill_index().refresh(conn)
+    finally:
+        conn.close()
 
 @app.route('/')
 def index():
@@ -205,6 +433,10 @@ def search_page():
 @app.route('/api/upload', methods=['POST'])
 def upload_cv():
     try:
+        # The request limit is sized for batches; single uploads keep the per-CV cap
+        if request.content_length and request.content_length > app.config['MAX_CV_SIZE'] + 64 * 1024:
+            return jsonify({'error': 'File is too large'}), 413
+        
         if 'cv_file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
         
@@ -217,20 +449,30 @@ def upload_cv():
         
         if file and file.filename.lower().endswith('.pdf'):
             filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            unique_filename = timestamp + filename
+            try:
+                content_hash, unique_filename = store_upload(file.stream, app.config['UPLOAD_FOLDER'],
+                                                             app.config['MAX_CV_SIZE'])
+            except FileTooLarge:
+                return jsonify({'error': 'File is too large'}), 413
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
             
-            file.save(file_path)
-            
-            # Analyze CV
-            analyzer = CVAnalyzer()
-            analysis = analyzer.analyze_cv(file_path)
+            run_async = request.values.get('async', str(app.config['ASYNC_ANALYSIS']))
+            run_async = run_async.lower() in ('1', 'true', 'yes')
             
-            # Save to database
-            conn = sqlite3.connect('cv_platform.db')
+            conn = get_db()
             c = conn.cursor()
             
+            # Reuse the analysis of an identical file, else analyze now
+            # or leave it to the background workers
+            analysis = get_cached_analysis(c, content_hash)
+            if analysis is None and not run_async:
+                try:
+                    analysis = analyze_upload(file_path)
+                except ExtractionError as e:
+                    return jsonify({'success': False, 'error': str(e), 'error_code': e.code}), 422
+                cache_analysis(c, content_hash, analysis)
+            
+            # Save to database
             # Insert user if not exists
             c.execute("INSERT OR IGNORE INTO users (name, email, user_type) VALUES (?, ?, ?)",
                      (user_name, user_email, 'student'))
@@ -240,16 +482,48 @@ def upload_cv():
             user_result = c.fetchone()
             user_id = user_result[0] if user_result else None
             
+            if analysis is None:
+                # Insert a placeholder CV record and queue its analysis
+                c.execute("INSERT INTO cvs (user_id, filename, original_filename, content_hash) VALUES (?, ?, ?, ?)",
+                         (user_id, unique_filename, filename, content_hash))
+                cv_id = c.lastrowid
+                c.execute("INSERT INTO analysis_jobs (cv_id, file_path) VALUES (?, ?)",
+                         (cv_id, file_path))
+                job_id = c.lastrowid
+                
+                conn.commit()
+                
+                start_analysis_workers()
+                _job_available.set()
+                
+                return jsonify({
+                    'success': True,
+                    'job_id': job_id,
+                    'cv_id': cv_id,
+                    'status': 'pending',
+                    'message': 'CV uploaded and queued for analysis'
+                }), 202
+            
             # Insert CV record
-            c.execute("INSERT INTO cvs (user_id, filename, original_filename, analysis_result) VALUES (?, ?, ?, ?)",
-                     (user_id, unique_filename, filename, json.dumps(analysis)))
+            c.execute("INSERT INTO cvs (user_id, filename, original_filename, analysis_result, score, content_hash, analyzer_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (user_id, unique_filename, filename, analysis_json(analysis), analysis['score'], content_hash,
+                      ANALYZER_VERSION))
+            cv_id = c.lastrowid
+            index_cv(c, cv_id, analysis)
             
             conn.commit()
-            conn.close()
+            get_match_index().refresh(conn)
+            get_skill_index().refresh(conn)
+            duplicates = find_duplicates(conn, [cv_id]).get(cv_id, [])
+            
+            # The extracted text stays server-side; clients get its length
+            analysis.pop('raw_text', None)
             
             return jsonify({
                 'success': True,
-                'analysis': analysis,
+                'cv_id': cv_id,
+                'analysis': select_fields(analysis, requested_fields()),
+                'duplicates': [{'id': other, 'similarity': similarity} for other, similarity, _ in duplicates],
                 'message': 'CV uploaded and analyzed successfully!'
             })
         
@@ -258,180 +532,431 @@ def upload_cv():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/search', methods=['POST'])
-def search_cvs():
-    try:
-        search_query = request.json.get('query', '').lower()
-        skills_filter = request.json.get('skills', [])
-        min_score = request.json.get('min_score', 0)
-        
-        conn = sqlite3.connect('cv_platform.db')
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    """Analyze many CVs (PDF files and/or zip archives) and stream NDJSON results"""
+    from concurrent.futures import as_completed
+    
+    files = [file for file in request.files.getlist('cv_files') if file.filename]
+    if not files:
+        return jsonify({'error': 'No files uploaded'}), 400
+    
+    user_name = request.form.get('user_name', 'Anonymous')
+    user_email = request.form.get('user_email', '')
+    upload_folder = app.config['UPLOAD_FOLDER']
+    
+    def line(payload):
+        return app.json.dumps(payload) + '\n'
+    
+    def generate():
+        conn = get_db()
         c = conn.cursor()
-        
-        c.execute("""SELECT cvs.*, users.name, users.email 
-                     FROM cvs 
-                     JOIN users ON cvs.user_id = users.id""")
-        
-        results = []
-        for row in c.fetchall():
-            analysis = json.loads(row[4]) if row[4] else {}
+        stored = []
+        failed = 0
+        futures = {}
+        pending = {}
+        
+        # Store each file as it is read, queueing analyses as we go
+        for count, (name, stream, error) in enumerate(iter_batch_files(files)):
+            if count >= app.config['MAX_BATCH_FILES']:
+                error = f"Batch limit of {app.config['MAX_BATCH_FILES']} files reached"
+            if error:
+                yield line({'file': name, 'status': 'failed', 'error': error})
+                failed += 1
+                continue
+            
+            filename = secure_filename(os.path.basename(name))
+            if not filename.lower().endswith('.pdf'):
+                yield line({'file': name, 'status': 'failed', 'error': 'Please upload a PDF file'})
+                failed += 1
+                continue
+            
+            try:
+                content_hash, unique_filename = store_upload(stream, upload_folder, app.config['MAX_CV_SIZE'])
+            except (FileTooLarge, zipfile.BadZipFile) as e:
+                yield line({'file': name, 'status': 'failed', 'error': str(e)})
+                failed += 1
+                continue
             
-            # Apply filters
-            if analysis.get('score', 0) < min_score:
+            item = {'file': name, 'filename': filename, 'stored_as': unique_filename,
+                    'content_hash': content_hash}
+            analysis = get_cached_analysis(c, content_hash)
+            if analysis is not None:
+                item['analysis'] = analysis
+                stored.append(item)
+                yield line({'file': name, 'status': 'done', 'cached': True, 'score': analysis['score'],
+                            'skills': analysis['skills']})
+            elif content_hash in pending:
+                # Duplicate inside the batch: share the analysis already queued
+                futures[pending[content_hash]].append(item)
+            else:
+                future = get_analysis_pool().submit(analyze_upload, os.path.join(upload_folder, unique_filename))
+                futures[future] = [item]
+                pending[content_hash] = future
+        
+        for future in as_completed(futures):
+            try:
+                analysis = future.result()
+            except Exception as e:
+                for item in futures[future]:
+                    failed += 1
+                    failure = {'file': item['file'], 'status': 'failed', 'error': str(e)}
+                    if isinstance(e, ExtractionError):
+                        failure['error_code'] = e.code
+                    yield line(failure)
                 continue
             
-            if skills_filter:
-                cv_skills = [skill.lower() for skill in analysis.get('skills', [])]
-                if not any(skill.lower() in cv_skills for skill in skills_filter):
-                    continue
+            for item in futures[future]:
+                item['analysis'] = analysis
+                stored.append(item)
+                yield line({'file': item['file'], 'status': 'done', 'cached': False,
+                            'score': analysis['score'], 'skills': analysis['skills']})
+        
+        # Store every analyzed CV in a single transaction, for the user named in
+        # the form as /api/upload does
+        cvs = []
+        if stored:
+            c.execute("INSERT OR IGNORE INTO users (name, email, user_type) VALUES (?, ?, ?)",
+                     (user_name, user_email, 'student'))
+            c.execute("SELECT id FROM users WHERE email = ?", (user_email,))
+            user_result = c.fetchone()
+            user_id = user_result[0] if user_result else None
             
-            if search_query:
-                searchable_text = (analysis.get('raw_text', '') + ' ' + 
-                                 ' '.join(analysis.get('skills', []))).lower()
-                if search_query not in searchable_text:
-                    continue
+            indexed = []
+            for item in stored:
+                analysis = item['analysis']
+                c.execute("INSERT INTO cvs (user_id, filename, original_filename, analysis_result, score, content_hash, analyzer_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (user_id, item['stored_as'], item['filename'], analysis_json(analysis), analysis['score'],
+                          item['content_hash'], ANALYZER_VERSION))
+                cvs.append({'file': item['file'], 'cv_id': c.lastrowid})
+                indexed.append((c.lastrowid, analysis))
+                cache_analysis(c, item['content_hash'], analysis)
             
-            results.append({
-                'id': row[0],
-                'filename': row[3],
-                'user_name': row[5],
-                'user_email': row[6],
-                'score': analysis.get('score', 0),
-                'skills': analysis.get('skills', []),
-                'uploaded_at': row[5]
-            })
+            index_cvs(c, indexed)
+            conn.commit()
+            get_match_index().refresh(conn)
+            get_skill_index().refresh(conn)
+            duplicates = find_duplicates(conn, [entry['cv_id'] for entry in cvs])
+            for entry in cvs:
+                entry['duplicates'] = [{'id': other, 'similarity': similarity}
+                                       for other, similarity, _ in duplicates.get(entry['cv_id'], [])]
+        
+        yield line({'status': 'committed', 'stored': len(stored), 'failed': failed, 'cvs': cvs})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/jobs/<int:job_id>')
+def get_job(job_id):
+    try:
+        # Make sure jobs recovered from a previous run are being processed
+        start_analysis_workers()
         
-        conn.close()
+        result = query_db("""SELECT analysis_jobs.id, analysis_jobs.cv_id, analysis_jobs.status,
+                                    analysis_jobs.error, analysis_jobs.error_code, cvs.analysis_result
+                             FROM analysis_jobs
+                             LEFT JOIN cvs ON cvs.id = analysis_jobs.cv_id
+                             WHERE analysis_jobs.id = ?""", (job_id,), one=True)
         
-        # Sort by score descending
-        results.sort(key=lambda x: x['score'], reverse=True)
+        if not result:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        # Queued and in-progress jobs are both reported as pending
+        status = 'pending' if result[2] == 'running' else result[2]
+        job = {
+            'id': result[0],
+            'cv_id': result[1],
+            'status': status,
+            'error': result[3],
+            'error_code': result[4]
+        }
+        if status == 'done' and result[5]:
+            job['analysis'] = json.loads(result[5])
+            duplicates = find_duplicates(get_db(), [result[1]]).get(result[1], [])
+            job['duplicates'] = [{'id': other, 'similarity': similarity} for other, similarity, _ in duplicates]
         
         return jsonify({
             'success': True,
-            'results': results[:20]  # Limit to 20 results
+            'job': job
         })
         
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/stats')
-def get_stats():
+@app.route('/api/search', methods=['POST'])
+def search_cvs():
     try:
-        conn = sqlite3.connect('cv_platform.db')
-        c = conn.cursor()
+        search_query = request.json.get('query', '').lower()
+        skills_filter = request.json.get('skills', [])
+        skills_mode = request.json.get('skills_mode', 'any')
+        collapse = bool(request.json.get('collapse_duplicates', False))
+        want_facets = bool(request.json.get('facets', False))
+        cursor = request.json.get('cursor')
         
-        # Get total CVs
-        c.execute("SELECT COUNT(*) FROM cvs")
-        total_cvs = c.fetchone()[0]
+        try:
+            min_score = float(request.json.get('min_score') or 0)
+            limit = int(request.json.get('limit', app.config['SEARCH_PAGE_SIZE']))
+            after = decode_cursor(cursor) if cursor else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid limit, cursor or min_score'}), 400
+        if skills_mode not in ('any', 'all'):
+            return jsonify({'error': "skills_mode must be 'any' or 'all'"}), 400
+        limit = max(1, min(limit, app.config['SEARCH_MAX_PAGE_SIZE']))
+        fields = requested_fields()
+        
+        fts_query = build_fts_query(search_query)
+        if search_query and not fts_query:
+            # Query has no searchable terms, so nothing can match
+            empty = {'success': True, 'results': [], 'total': 0,
+                     'total_is_estimate': False, 'next_cursor': None}
+            if want_facets:
+                empty['facets'] = []
+            return jsonify(empty)
+        
+        # Skill and score filters are bitmap operations on the in-memory index
+        skill_index = get_skill_index()
+        skill_index.refresh(get_db())
+        selected = skill_index.select(skills_filter, skills_mode == 'all', min_score)
+        top = skill_index.top
+        total_is_estimate = False
+        if fts_query and want_facets:
+            # Facets need the whole result set: narrow the bitmap to every FTS5 match
+            matched = query_db("SELECT rowid FROM cvs_fts WHERE cvs_fts MATCH ?", (fts_query,))
+            selected &= bitmap([row[0] for row in matched])
+        total = selected.bit_count()
+        
+        # Keyset pagination: resume strictly after the last (score, id) returned
+        count_limit = app.config['SEARCH_COUNT_LIMIT']
+        if fts_query and not want_facets:
+            # Without facets only a page of matches is read, and counting stops
+            # at SEARCH_COUNT_LIMIT
+            top = functools.partial(fts_top, fts_query, min_score=min_score)
+            if collapse or after:
+                if collapse:
+                    page, collapsed = top_distinct(top, selected, limit + 1, after)
+                else:
+                    page = top(selected, limit + 1, after)
+                matches = iter_fts_matches(fts_query, selected, min_score=min_score)
+                total = count_matches(matches, count_limit)
+            else:
+                # The first page and the count come from a single walk
+                matches = iter_fts_matches(fts_query, selected, min_score=min_score)
+                page = list(itertools.islice(matches, limit + 1))
+                total = len(page) + count_matches(matches, count_limit - len(page))
+            total_is_estimate = total > count_limit
+            total = min(total, count_limit)
+        elif collapse:
+            page, collapsed = top_distinct(top, selected, limit + 1, after)
+        else:
+            page = top(selected, limit + 1, after)
+        ids = [cv_id for _, cv_id in page[:limit]]
+        
+        rows = {}
+        if ids:
+            # Skills are the only column parsed out of the stored JSON; skip it when unwanted
+            skills_column = "json_extract(cvs.analysis_result, '$.skills')" if fields is None or 'skills' in fields else "NULL"
+            placeholders = ', '.join('?' * len(ids))
+            for row in query_db(f"""SELECT cvs.id, cvs.filename, cvs.uploaded_at, users.name, users.email,
+                                           cvs.score, {skills_column}
+                                    FROM cvs
+                                    JOIN users ON cvs.user_id = users.id
+                                    WHERE cvs.id IN ({placeholders})""", ids):
+                rows[row[0]] = row
+        
+        results = []
+        for cv_id in ids:
+            row = rows[cv_id]
+            result = {
+                'id': row[0],
+                'filename': row[1],
+                'user_name': row[3],
+                'user_email': row[4],
+                'score': row[5] or 0,
+                'skills': json.loads(row[6]) if row[6] else [],
+                'uploaded_at': row[2]
+            }
+            if collapse:
+                result['duplicates'] = collapsed[cv_id]
+            results.append(select_fields(result, fields))
+        
+        next_cursor = None
+        if len(page) > limit:
+            next_cursor = encode_cursor(*page[limit - 1])
+        
+        response = {
+            'success': True,
+            'results': results,
+            'total': total,
+            'total_is_estimate': total_is_estimate,
+            'next_cursor': next_cursor
+        }
+        if want_facets:
+            response['facets'] = [{'skill': skill, 'count': count} for skill, count in skill_index.facets(selected)]
+        return jsonify(response)
         
-        # Get total users
-        c.execute("SELECT COUNT(*) FROM users")
-        total_users = c.fetchone()[0]
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/match', methods=['POST'])
+def match_job_description():
+    """Rank CVs against a pasted job description"""
+    try:
+        job_description = request.json.get('job_description', '')
+        if not job_description.strip():
+            return jsonify({'error': 'No job description provided'}), 400
         
-        # Get average score
-        c.execute("SELECT analysis_result FROM cvs WHERE analysis_result IS NOT NULL")
-        scores = []
-        for row in c.fetchall():
-            try:
-                analysis = json.loads(row[0])
-                scores.append(analysis.get('score', 0))
-            except:
-                continue
+        try:
+            limit = int(request.json.get('limit', 10))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid limit'}), 400
+        limit = max(1, min(limit, app.config['MATCH_MAX_RESULTS']))
         
-        avg_score = sum(scores) / len(scores) if scores else 0
+        # Pick up CVs stored since the last query, including by other processes
+        match_index = get_match_index()
+        match_index.refresh(get_db())
+        matches = match_index.search(job_description, limit)
         
-        conn.close()
+        wanted_skills = get_analyzer().extract_skills(job_description)
+        results = []
+        if matches:
+            relevance = dict(matches)
+            placeholders = ', '.join('?' * len(matches))
+            rows = query_db(f"""SELECT cvs.id, cvs.filename, cvs.score, users.name, users.email,
+                                       (SELECT group_concat(skill, char(31)) FROM cv_skills
+                                        WHERE cv_skills.cv_id = cvs.id)
+                                FROM cvs
+                                JOIN users ON cvs.user_id = users.id
+                                WHERE cvs.id IN ({placeholders})""", list(relevance))
+            
+            for row in rows:
+                cv_skills = set(row[5].split(chr(31))) if row[5] else set()
+                matched = [skill for skill in wanted_skills if skill.lower() in cv_skills]
+                results.append({
+                    'id': row[0],
+                    'filename': row[1],
+                    'score': row[2] or 0,
+                    'user_name': row[3],
+                    'user_email': row[4],
+                    'relevance': round(relevance[row[0]], 3),
+                    'matched_skills': matched,
+                    'missing_skills': [skill for skill in wanted_skills if skill not in matched],
+                    'skill_overlap': round(len(matched) / len(wanted_skills), 2) if wanted_skills else None
+                })
+            results.sort(key=lambda result: result['relevance'], reverse=True)
         
         return jsonify({
-            'total_cvs': total_cvs,
-            'total_users': total_users,
-            'average_score': round(avg_score, 1)
+            'success': True,
+            'skills': wanted_skills,
+            'results': results
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Last /api/stats payload as (expires_at, payload, etag)
+_stats_cache = None
+
+def load_stats():
+    """Read the trigger-maintained aggregates; cost does not grow with the corpus"""
+    total_cvs, total_users, score_sum, score_count = query_db(
+        "SELECT total_cvs, total_users, score_sum, score_count FROM stats_summary WHERE id = 1", one=True)
+    
+    histogram = [{'range': f'{bucket * 10}-{bucket * 10 + (10 if bucket == 9 else 9)}', 'count': count}
+                 for bucket, count in query_db("SELECT bucket, count FROM score_histogram ORDER BY bucket")]
+    top_skills = [{'skill': skill, 'count': count}
+                  for skill, count in query_db("""SELECT skill, count FROM skill_counts
+                                                  WHERE count > 0
+                                                  ORDER BY count DESC LIMIT 10""")]
+    
+    return {
+        'total_cvs': total_cvs,
+        'total_users': total_users,
+        'average_score': round(score_sum / score_count, 1) if score_count else 0,
+        'score_histogram': histogram,
+        'top_skills': top_skills
+    }
+
+@app.route('/api/stats')
+def get_stats():
+    global _stats_cache
+    try:
+        now = time.monotonic()
+        if _stats_cache is None or _stats_cache[0] <= now:
+            payload = load_stats()
+            etag = hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+            _stats_cache = (now + app.config['STATS_CACHE_TTL'], payload, etag)
+        
+        expires_at, payload, etag = _stats_cache
+        
+        # Dashboards polling with If-None-Match get an empty 304 when nothing changed
+        response = jsonify(payload)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    if not app.config['METRICS_ENABLED']:
+        abort(404)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+def render_report(analysis, filename=None, generated_on=None):
+    """Render the HTML analysis report for one CV"""
+    return render_template('report.html', analysis=analysis, filename=filename,
+                           generated_on=generated_on or datetime.now())
+
+@app.route('/api/report/<int:cv_id>')
+def get_report(cv_id):
+    """Download a CV's analysis report, rendered once and then served from disk"""
+    try:
+        row = query_db("SELECT original_filename, analysis_result FROM cvs WHERE id = ?", (cv_id,), one=True)
+        if not row or not row[1]:
+            return jsonify({'success': False, 'error': 'Report not found'}), 404
+        
+        version = report_version(row[1])
+        encoding = choose_encoding(request.accept_encodings)
+        etag = f"{cv_id}-{version}-{encoding or 'identity'}"
+        
+        response = Response(mimetype='text/html')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        if request.args.get('download'):
+            response.headers['Content-Disposition'] = f'attachment; filename=cv_report_{cv_id}.html'
+        
+        # A client holding this version gets a 304 without the file being read
+        if request.if_none_match.contains(etag):
+            return response.make_conditional(request)
+        
+        cache = ReportCache(app.config['REPORT_CACHE_FOLDER'])
+        body = cache.get(cv_id, version, encoding)
+        if body is None:
+            analysis = json.loads(row[1])
+            generated_on = datetime.fromisoformat(analysis['timestamp']) if analysis.get('timestamp') else None
+            body = cache.store(cv_id, version, render_report(analysis, row[0], generated_on))[encoding]
+        
+        response.set_data(body)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+        
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/api/download-report', methods=['POST'])
 def download_report():
-    """Generate and download CV analysis report"""
+    """Generate and download CV analysis report (prefer GET /api/report/<cv_id>)"""
     try:
         analysis_data = request.json.get('analysis')
         if not analysis_data:
             return jsonify({'error': 'No analysis data provided'}), 400
         
-        # Generate HTML report
-        report_html = f"""
-        <!DOCTYPE html>
-        <html lang="en">
-        <head>
-            <meta charset="UTF-8">
-            <title>CV Analysis Report</title>
-            <style>
-                body {{ font-family: Arial, sans-serif; margin: 40px; line-height: 1.6; }}
-                .header {{ text-align: center; margin-bottom: 30px; border-bottom: 2px solid #667eea; padding-bottom: 20px; }}
-                .score {{ font-size: 3em; color: #667eea; font-weight: bold; }}
-                .section {{ margin: 30px 0; padding: 20px; border-left: 4px solid #667eea; background: #f8fafc; }}
-                .skills {{ display: flex; flex-wrap: wrap; gap: 10px; }}
-                .skill {{ background: #667eea; color: white; padding: 5px 15px; border-radius: 20px; }}
-                .recommendations li {{ margin: 10px 0; }}
-            </style>
-        </head>
-        <body>
-            <div class="header">
-                <h1>CV Analysis Report</h1>
-                <div class="score">{analysis_data.get('score', 0)}/100</div>
-                <p>Generated on {datetime.now().strftime('%m/%d/%Y at %H:%M')}</p>
-            </div>
-            
-            <div class="section">
-                <h2>📊 Overall Score</h2>
-                <p>Your CV received a score of <strong>{analysis_data.get('score', 0)}/100</strong>.</p>
-                <p>{'Excellent work!' if analysis_data.get('score', 0) >= 80 else 'Good work, some improvements possible.' if analysis_data.get('score', 0) >= 60 else 'There is room for improvements.'}</p>
-            </div>
-            
-            <div class="section">
-                <h2>🛠️ Skills Detected</h2>
-                <div class="skills">
-                    {' '.join([f'<span class="skill">{skill}</span>' for skill in analysis_data.get('skills', [])]) if analysis_data.get('skills') else '<p>No technical skills detected</p>'}
-                </div>
-            </div>
-            
-            <div class="section">
-                <h2>💼 Professional Experience</h2>
-                <p><strong>{len(analysis_data.get('experience', []))}</strong> professional experience(s) detected</p>
-                {'<ul>' + ''.join([f'<li>{exp}</li>' for exp in analysis_data.get('experience', [])[:3]]) + '</ul>' if analysis_data.get('experience') else '<p>No detailed experience found</p>'}
-            </div>
-            
-            <div class="section">
-                <h2>💡 Improvement Recommendations</h2>
-                <ul class="recommendations">
-                    {' '.join([f'<li>{rec}</li>' for rec in analysis_data.get('recommendations', [])]) if analysis_data.get('recommendations') else '<li>Keep up the excellent work!</li>'}
-                </ul>
-            </div>
-            
-            <div class="section">
-                <h2>📞 Contact Information</h2>
-                <p><strong>Email:</strong> {analysis_data.get('contact', {}).get('email', 'Not detected')}</p>
-                <p><strong>Phone:</strong> {analysis_data.get('contact', {}).get('phone', 'Not detected')}</p>
-            </div>
-            
-            <div class="section">
-                <h2>📈 Tips to Improve Your Score</h2>
-                <ul>
-                    <li>Ensure your contact information is complete and visible</li>
-                    <li>Clearly list your technical skills</li>
-                    <li>Detail your professional experience with concrete examples</li>
-                    <li>Use relevant keywords for your field</li>
-                    <li>Quantify your achievements when possible</li>
-                </ul>
-            </div>
-        </body>
-        </html>
-        """
-        
         return jsonify({
             'success': True,
-            'report_html': report_html,
+            'report_html': render_report(analysis_data),
             'filename': f'cv_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.html'
         })
         
@@ -441,28 +966,23 @@ def download_report():
 @app.route('/api/profile/<int:candidate_id>')
 def get_profile(candidate_id):
     try:
-        conn = sqlite3.connect('cv_platform.db')
-        c = conn.cursor()
-        
-        c.execute("""SELECT cvs.*, users.name, users.email 
-                     FROM cvs 
-                     JOIN users ON cvs.user_id = users.id 
-                     WHERE cvs.id = ?""", (candidate_id,))
-        
-        result = c.fetchone()
-        conn.close()
+        result = query_db("""SELECT cvs.id, cvs.original_filename, cvs.analysis_result, cvs.uploaded_at,
+                                    users.name, users.email
+                             FROM cvs 
+                             JOIN users ON cvs.user_id = users.id 
+                             WHERE cvs.id = ?""", (candidate_id,), one=True)
         
         if not result:
             return jsonify({'success': False, 'error': 'Profile not found'}), 404
         
-        analysis = json.loads(result[4]) if result[4] else {}
+        analysis = json.loads(result[2]) if result[2] else {}
         
         profile = {
             'id': result[0],
-            'user_name': result[5],
-            'user_email': result[6],
-            'filename': result[3],
-            'uploaded_at': result[5],
+            'user_name': result[4],
+            'user_email': result[5],
+            'filename': result[1],
+            'uploaded_at': result[3],
             'score': analysis.get('score', 0),
             'skills': analysis.get('skills', []),
             'experience': analysis.get('experience', []),
@@ -472,12 +992,14 @@ def get_profile(candidate_id):
         
         return jsonify({
             'success': True,
-            'profile': profile
+            'profile': select_fields(profile, requested_fields())
         })
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
+    create_app()
+    start_analysis_workers()
     # Make accessible from any network
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1', host='0.0.0.0', port=5000)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Smart CV Management Platform - Analyzer Micro-benchmark
+Time the text analysis of a CV (everything after PDF extraction) against the
+previous per-call implementation, and check that both give the same result.
+
+Usage: python bench_analyzer.py [--cvs 200] [--pages 3] [--repeat 5]
+"""
+
+import argparse
+import random
+import re
+import time
+
+from analyzer import CVAnalyzer, get_analyzer
+
+LINES = [
+    'Professional Experience',
+    'Senior Software Engineer, Acme Corp (2019 - present)',
+    'Built data pipelines in Python and SQL on AWS',
+    'Led a team of five developers using Agile and Scrum',
+    'Work history',
+    'Backend Developer at Initech, 2016 - 2019',
+    'Migrated services to Docker and Kubernetes',
+    'Education',
+    'BSc Computer Science, University of Somewhere',
+    'Skills: JavaScript, React, Node.js, PostgreSQL, Git, Linux',
+    'Languages: English, French',
+    'Interests: hiking, chess, open source',
+    'Volunteered teaching programming to high school students',
+    'Certified in project management and leadership',
+]
+
+def make_cv(rng, pages):
+    """Return the page texts of a synthetic CV"""
+    texts = []
+    for page in range(pages):
+        lines = [rng.choice(LINES) for _ in range(40)]
+        if page == 0:
+            lines[:2] = ['Jane Doe', f'jane.doe{rng.randint(1, 999)}@example.com | +44 {rng.randint(10**9, 10**10 - 1)}']
+        texts.append('\n'.join(lines) + '\n')
+    return texts
+
+def legacy_analyze(analyzer, pages):
+    """The analysis as it ran before the regex work was cut down (baseline)"""
+    contact = {'email': None, 'phone': None}
+    skills = []
+    experience = []
+    capture_next = False
+    for text in pages:
+        if not contact['email']:
+            email = re.search(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', text)
+            contact['email'] = email.group() if email else None
+        if not contact['phone']:
+            phone = re.search(r'[\+]?[1-9]?[0-9]{7,15}', text)
+            contact['phone'] = phone.group() if phone else None
+        matcher = analyzer.skill_matcher
+        for match in matcher.pattern.finditer(text):
+            skill = matcher.aliases[' '.join(match.group().lower().split())]
+            if skill not in skills:
+                skills.append(skill)
+        keywords = ['experience', 'work', 'employment', 'career', 'position', 'job', 'role']
+        for line in text.split('\n'):
+            if len(experience) >= 5:
+                break
+            line_lower = line.lower()
+            if any(keyword in line_lower for keyword in keywords):
+                capture_next = True
+            elif capture_next and line.strip():
+                if len(line.strip()) > 10:
+                    experience.append(line.strip())
+    return contact, skills, experience
+
+def current_analyze(analyzer, pages):
+    analysis = analyzer.analyze_text(pages)
+    return analysis['contact'], analysis['skills'], analysis['experience']
+
+def bench(name, func, cvs, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for pages in cvs:
+            func(pages)
+        best = min(best, time.perf_counter() - started)
+    per_cv = best / len(cvs) * 1e6
+    print(f"{name:<10} {per_cv:9.1f} µs/CV")
+    return per_cv
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark CV text analysis')
+    parser.add_argument('--cvs', type=int, default=200, help='Synthetic CVs per run (default: 200)')
+    parser.add_argument('--pages', type=int, default=3, help='Pages per CV (default: 3)')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per variant; the best is kept (default: 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cvs = [make_cv(rng, args.pages) for _ in range(args.cvs)]
+
+    for pages in cvs:
+        if legacy_analyze(get_analyzer(), pages) != current_analyze(get_analyzer(), pages):
+            raise SystemExit('❌ Current analyzer disagrees with the baseline')
+
+    print(f"📄 {args.cvs} CVs x {args.pages} pages, best of {args.repeat}")
+    legacy = bench('baseline', lambda pages: legacy_analyze(CVAnalyzer(), pages), cvs, args.repeat)
+    current = bench('current', lambda pages: current_analyze(get_analyzer(), pages), cvs, args.repeat)
+    print(f"⚡ {legacy / current:.2f}x faster per CV")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+"""
+Smart CV Management Platform - Benchmark Suite
+Generate synthetic PDF CVs, seed a database with N CVs and time the analyzer
+stages and the main API endpoints, reporting p50/p95/p99 latency and throughput.
+
+Usage:
+    python benchmark.py run [--rows 1000] [--requests 200] [--output results.json]
+                            [--compare baseline.json --threshold 0.25]
+    python benchmark.py startup [--max-ms 400]
+    python benchmark.py corpus /path/to/folder [--count 100]
+
+Everything runs inside --workdir (default: bench), which gets its own
+cv_platform.db, uploads/ and match_index/, so real data is never touched.
+Seeding is skipped when the database already holds enough CVs.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_NAMES = ['Alex', 'Sam', 'Maria', 'Chen', 'Fatima', 'Liam', 'Priya', 'Jonas', 'Ana', 'Kofi']
+LAST_NAMES = ['Smith', 'Garcia', 'Wang', 'Okafor', 'Novak', 'Silva', 'Kumar', 'Berg', 'Rossi', 'Mensah']
+TITLES = ['Software Engineer', 'Data Scientist', 'Product Designer', 'DevOps Engineer', 'Project Manager']
+COMPANIES = ['Acme Corp', 'Initech', 'Globex', 'Umbrella Labs', 'Hooli', 'Stark Industries']
+FILLER = [
+    'Delivered projects on time for international clients',
+    'Mentored junior colleagues and ran internal workshops',
+    'Improved reporting so the team could plan releases',
+    'Worked closely with customers to gather requirements',
+    'Volunteered at a local coding club on weekends',
+    'Fluent in English and Spanish, conversational German',
+]
+SEARCH_WORDS = ['engineer', 'data', 'manager', 'designer', 'cloud', 'python', 'team', 'customers']
+
+# --- Synthetic CVs ---
+
+def generate_cv(rng, skills, pages=None, skill_density=None):
+    """Return the lines of each page of a synthetic CV.
+
+    skill_density is the share of body lines that mention skills."""
+    pages = pages or rng.choice([1, 1, 2, 2, 3, 4])
+    skill_density = rng.uniform(0.05, 0.6) if skill_density is None else skill_density
+    name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+    email = f'{name.lower().replace(" ", ".")}{rng.randrange(10**6)}@example.com'
+
+    result = []
+    for page in range(pages):
+        lines = []
+        if page == 0:
+            lines += [name, f'{email} | +44 {rng.randrange(10**9, 10**10)}', 'Professional Experience']
+        while len(lines) < 45:
+            if rng.random() < skill_density:
+                lines.append('Used ' + ', '.join(rng.sample(skills, rng.randint(1, 4))) + ' daily')
+            elif rng.random() < 0.3:
+                lines.append(f'{rng.choice(TITLES)} at {rng.choice(COMPANIES)}, {rng.randint(2005, 2024)}')
+            else:
+                lines.append(rng.choice(FILLER))
+        result.append(lines)
+    return result
+
+def make_pdf(pages):
+    """Build a minimal PDF (Helvetica text, one content stream per page)"""
+    objects = ['<< /Type /Catalog /Pages 2 0 R >>', None,
+               '<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for lines in pages:
+        escaped = [line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for line in lines]
+        content = 'BT /F1 10 Tf 40 800 Td 16 TL ' + ' '.join(f'({line}) Tj T*' for line in escaped) + ' ET'
+        page_id = len(objects) + 1
+        kids.append(f'{page_id} 0 R')
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] '
+                       f'/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>')
+        objects.append(f'<< /Length {len(content.encode("latin-1"))} >>\nstream\n{content}\nendstream')
+    objects[1] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {len(kids)} >>'
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n{body}\nendobj\n'.encode('latin-1')
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('latin-1')
+    out += ''.join(f'{offset:010d} 00000 n \n' for offset in offsets).encode('latin-1')
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode('latin-1')
+    return bytes(out)
+
+def write_corpus(directory, count, seed, skills):
+    """Write count synthetic CVs to directory as PDF files"""
+    os.makedirs(directory, exist_ok=True)
+    rng = random.Random(seed)
+    for number in range(count):
+        with open(os.path.join(directory, f'cv_{number:06d}.pdf'), 'wb') as file:
+            file.write(make_pdf(generate_cv(rng, skills)))
+
+# --- Measurement ---
+
+def percentile(sorted_values, fraction):
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def summarize(samples, elapsed=None):
+    """Latency percentiles in milliseconds and throughput in operations per second"""
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 0.99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'throughput_per_s': round(len(ordered) / (elapsed or sum(ordered)), 1),
+    }
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - started, result
+
+def bench_analyzer(rng, skills, count):
+    """Time each stage of CVAnalyzer.analyze_cv on freshly generated PDFs"""
+    from analyzer import get_analyzer
+    analyzer = get_analyzer()
+    stages = {name: [] for name in ('extract', 'contact', 'skills', 'experience', 'score', 'analyze_cv')}
+    path = os.path.join('uploads', 'benchmark_stage.pdf')
+
+    for _ in range(count):
+        with open(path, 'wb') as file:
+            file.write(make_pdf(generate_cv(rng, skills)))
+
+        elapsed, pages = timed(lambda: list(analyzer.iter_pdf_pages(path)))
+        stages['extract'].append(elapsed)
+        contact = {'email': None, 'phone': None}
+        found = []
+        experience = []
+        capture = False
+        timings = [0.0, 0.0, 0.0]
+        for text in pages:
+            timings[0] += timed(analyzer.update_contact_info, contact, text)[0]
+            timings[1] += timed(analyzer.update_skills, found, text)[0]
+            elapsed, capture = timed(analyzer.update_experience, experience, text, capture)
+            timings[2] += elapsed
+        for name, elapsed in zip(('contact', 'skills', 'experience'), timings):
+            stages[name].append(elapsed)
+
+        text = ''.join(pages)
+        analysis = {'text_length': len(text), 'contact': contact, 'skills': found, 'experience': experience}
+        stages['score'].append(timed(lambda: (analyzer.calculate_score(analysis),
+                                              analyzer.generate_recommendations(analysis)))[0])
+        stages['analyze_cv'].append(timed(analyzer.analyze_cv, path)[0])
+
+    os.remove(path)
+    return {f'analyzer.{name}': summarize(samples) for name, samples in stages.items()}
+
+def seed_database(rng, skills, rows, batch_size=5000):
+    """Insert synthetic analyzed CVs until the database holds rows CVs"""
+    from analyzer import ANALYZER_VERSION, get_analyzer
+    from database import connect, index_cvs, analysis_json
+
+    conn = connect()
+    c = conn.cursor()
+    existing = c.execute("SELECT COUNT(*) FROM cvs").fetchone()[0]
+    if existing >= rows:
+        conn.close()
+        return existing, None
+
+    analyzer = get_analyzer()
+    started = time.perf_counter()
+    for start in range(existing, rows, batch_size):
+        batch = []
+        for _ in range(min(batch_size, rows - start)):
+            analysis = analyzer.analyze_text('\n'.join(lines) + '\n' for lines in generate_cv(rng, skills))
+            batch.append(analysis)
+
+        c.execute("BEGIN IMMEDIATE")
+        emails = [analysis['contact']['email'] for analysis in batch]
+        c.executemany("INSERT OR IGNORE INTO users (name, email, user_type) VALUES (?, ?, ?)",
+                     [('Benchmark', email, 'student') for email in emails])
+        placeholders = ', '.join('?' * len(emails))
+        user_ids = dict(c.execute(f"SELECT email, id FROM users WHERE email IN ({placeholders})", emails).fetchall())
+
+        indexed = []
+        for analysis in batch:
+            content_hash = hashlib.sha256(analysis['raw_text'].encode('utf-8')).hexdigest()
+            c.execute("INSERT INTO cvs (user_id, filename, original_filename, analysis_result, score, content_hash, analyzer_version) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (user_ids[analysis['contact']['email']], f'{content_hash}.pdf', 'synthetic.pdf',
+                      analysis_json(analysis), analysis['score'], content_hash, ANALYZER_VERSION))
+            indexed.append((c.lastrowid, analysis))
+        index_cvs(c, indexed)
+        conn.commit()
+        print(f"🌱 Seeded {start + len(batch)}/{rows} CVs", file=sys.stderr)
+
+    elapsed = time.perf_counter() - started
+    conn.close()
+    return rows, {'rows': rows - existing, 'seconds': round(elapsed, 2),
+                  'rows_per_s': round((rows - existing) / elapsed, 1)}
+
+def bench_endpoint(client, name, requests, make_request):
+    """Call an endpoint requests times and summarize its latency"""
+    samples = []
+    started = time.perf_counter()
+    for number in range(requests):
+        elapsed, response = timed(make_request, number)
+        if response.status_code >= 400:
+            raise SystemExit(f'❌ {name} returned {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        samples.append(elapsed)
+    return summarize(samples, time.perf_counter() - started)
+
+# Modules only some requests need; importing app must not pull them in
+LAZY_MODULES = ('PyPDF2', 'numpy', 'matching', 'textblob', 'nltk', 'multiprocessing')
+
+def measure_import(module='app', runs=5):
+    """Import module in fresh interpreters under -X importtime.
+
+    Returns (cumulative import times in seconds, lazy modules it imported)."""
+    samples = []
+    eager = set()
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                cwd=SCRIPT_DIR, capture_output=True, text=True, check=True)
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if name.strip() in LAZY_MODULES:
+                eager.add(name.strip())
+            if name.rstrip() == f' {module}':
+                samples.append(int(cumulative) / 1e6)
+    return samples, sorted(eager)
+
+def bench_api(rng, skills, requests):
+    """Time the API endpoints through Flask's test client"""
+    import io
+    import logging
+    # The per-request log lines would drown the report
+    logging.getLogger('cv_platform.requests').disabled = True
+    from app import create_app, get_match_index
+    from database import pool
+    elapsed, app = timed(create_app)
+    results = {'startup.create_app': summarize([elapsed])}
+
+    conn = pool.acquire()
+    try:
+        elapsed, _ = timed(get_match_index().build, conn)
+        results['startup.match_index_build'] = summarize([elapsed])
+        max_id = conn.execute("SELECT MAX(id) FROM cvs").fetchone()[0] or 1
+    finally:
+        pool.release(conn)
+
+    client = app.test_client()
+    pdfs = [make_pdf(generate_cv(rng, skills)) for _ in range(requests)]
+
+    results['api.upload'] = bench_endpoint(client, 'upload', requests, lambda n: client.post(
+        '/api/upload', data={'cv_file': (io.BytesIO(pdfs[n]), f'cv_{n}.pdf')},
+        content_type='multipart/form-data'))
+    results['api.upload_cached'] = bench_endpoint(client, 'upload (cached)', requests, lambda n: client.post(
+        '/api/upload', data={'cv_file': (io.BytesIO(pdfs[n]), f'cv_{n}.pdf')},
+        content_type='multipart/form-data'))
+    results['api.search'] = bench_endpoint(client, 'search', requests, lambda n: client.post(
+        '/api/search', json={'query': rng.choice(SEARCH_WORDS + [''] * 3),
+                             'skills': rng.sample(skills, rng.randint(0, 2)),
+                             'min_score': rng.choice([0, 0, 40, 70])}))
+    results['api.stats'] = bench_endpoint(client, 'stats', requests, lambda n: client.get('/api/stats'))
+    results['api.profile'] = bench_endpoint(client, 'profile', requests, lambda n: client.get(
+        f'/api/profile/{rng.randint(1, max_id)}'))
+    return results
+
+def compare(results, baseline, threshold):
+    """Return the benchmarks whose p50 or p95 grew by more than threshold"""
+    regressions = []
+    for name, current in results['benchmarks'].items():
+        previous = baseline.get('benchmarks', {}).get(name)
+        if not previous:
+            continue
+        for metric in ('p50_ms', 'p95_ms'):
+            # Sub-millisecond timings are too noisy to gate on
+            if previous[metric] >= 0.1 and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f'{name} {metric}: {previous[metric]} -> {current[metric]}')
+    return regressions
+
+def run(args, skills):
+    os.makedirs(os.path.join(args.workdir, 'uploads'), exist_ok=True)
+    os.chdir(args.workdir)
+
+    if args.no_metrics:
+        os.environ['CV_METRICS'] = '0'
+
+    import database
+    database.init_db()
+    rng = random.Random(args.seed)
+
+    results = {
+        'created_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'rows': args.rows,
+        'requests': args.requests,
+        'metrics': not args.no_metrics,
+        'benchmarks': {},
+    }
+    rows, seeding = seed_database(rng, skills, args.rows)
+    results['rows'] = rows
+    if seeding:
+        results['seeding'] = seeding
+
+    samples, eager = measure_import()
+    results['benchmarks']['startup.import_app'] = summarize(samples)
+    results['eager_imports'] = eager
+
+    results['benchmarks'].update(bench_analyzer(rng, skills, args.requests))
+    results['benchmarks'].update(bench_api(rng, skills, args.requests))
+
+    print(f"{'benchmark':<30} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>10}")
+    for name, stats in results['benchmarks'].items():
+        print(f"{name:<30} {stats['p50_ms']:>9} {stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['throughput_per_s']:>10}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"💾 Results saved to {args.output}")
+
+    if eager:
+        print(f"⚠️  Importing app loads {', '.join(eager)}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            sys.exit(1)
+        print(f"✅ No regressions over {args.threshold:.0%} against {args.compare}")
+
+def check_startup(args):
+    """Guard against import-time regressions; returns the exit status"""
+    samples, eager = measure_import(runs=args.runs)
+    stats = summarize(samples)
+    print(f"⏱️  import app: p50 {stats['p50_ms']} ms, max {max(samples) * 1000:.1f} ms over {args.runs} runs")
+    failed = False
+    if eager:
+        print(f"❌ Importing app loads modules that should be lazy: {', '.join(eager)}")
+        failed = True
+    if stats['p50_ms'] > args.max_ms:
+        print(f"❌ Import is slower than {args.max_ms} ms")
+        failed = True
+    if not failed:
+        print("✅ Startup within budget")
+    return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the CV platform on synthetic data')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='Seed a database and time the analyzer and API')
+    run_parser.add_argument('--rows', type=int, default=1000,
+                            help='CVs in the benchmark database, e.g. 1000, 100000 or 1000000 (default: 1000)')
+    run_parser.add_argument('--requests', type=int, default=200,
+                            help='Timed calls per benchmark (default: 200)')
+    run_parser.add_argument('--workdir', default=os.path.join(SCRIPT_DIR, 'bench'),
+                            help='Folder for the benchmark database, uploads and index (default: bench)')
+    run_parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic data')
+    run_parser.add_argument('--no-metrics', action='store_true',
+                            help='Run with instrumentation off (CV_METRICS=0) to measure its overhead')
+    run_parser.add_argument('--output', help='Save results as JSON to this file')
+    run_parser.add_argument('--compare', help='Earlier results JSON to check for regressions')
+    run_parser.add_argument('--threshold', type=float, default=0.25,
+                            help='Allowed p50/p95 slowdown before --compare fails (default: 0.25 = 25%%)')
+
+    startup_parser = commands.add_parser('startup', help='Check the cold import time of the app')
+    startup_parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to time (default: 5)')
+    startup_parser.add_argument('--max-ms', type=float, default=400,
+                                help='Fail when the median import of app takes longer (default: 400)')
+
+    corpus_parser = commands.add_parser('corpus', help='Write synthetic PDF CVs to a folder')
+    corpus_parser.add_argument('directory')
+    corpus_parser.add_argument('--count', type=int, default=100, help='Number of CVs (default: 100)')
+    corpus_parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    from skills import load_taxonomy
+    skills = list(load_taxonomy())
+
+    if args.command == 'startup':
+        sys.exit(check_startup(args))
+    elif args.command == 'corpus':
+        write_corpus(args.directory, args.count, args.seed, skills)
+        print(f"📄 Wrote {args.count} synthetic CVs to {args.directory}")
+    else:
+        # Paths are resolved before run() moves into the work directory
+        for option in ('workdir', 'output', 'compare'):
+            if getattr(args, option):
+                setattr(args, option, os.path.abspath(getattr(args, option)))
+        run(args, skills)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,426 @@
+import sqlite3
+import json
+import queue
+import zlib
+import metrics
+from analyzer import ANALYZER_VERSION
+
+DATABASE = 'cv_platform.db'
+SCHEMA_VERSION = 11
+
+BUSY_TIMEOUT = 10  # Seconds to wait for another writer before "database is locked"
+CACHE_SIZE_KB = 32 * 1024  # Page cache per connection
+POOL_SIZE = 16  # Idle connections kept for reuse
+
+def connect():
+    """Open a connection tuned for concurrent readers and a single writer"""
+    conn = sqlite3.connect(DATABASE, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                           cached_statements=256, factory=metrics.connection_factory())
+    # WAL lets searches read while an upload is writing; NORMAL is safe under WAL
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+class ConnectionPool:
+    """Reuse open connections across requests and worker threads.
+    
+    A connection is used by one thread at a time; release() hands it back."""
+    
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._idle = queue.LifoQueue()
+    
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return connect()
+    
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+pool = ConnectionPool()
+
+def init_db():
+    """Bring the schema up to date; cheap when it already is"""
+    conn = connect()
+    c = conn.cursor()
+    
+    if c.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        migrate(c)
+    
+    conn.commit()
+    conn.close()
+
+def requeue_interrupted_jobs():
+    """Mark jobs left running by a previous server as pending again.
+    
+    Only the server calls this at startup: command-line tools run next to a
+    live server, whose running jobs are not interrupted."""
+    conn = connect()
+    conn.execute("UPDATE analysis_jobs SET status = 'pending' WHERE status = 'running'")
+    conn.commit()
+    conn.close()
+
+def migrate(c):
+    """Create the original tables and apply every pending migration"""
+    # Users table
+    c.execute('''CREATE TABLE IF NOT EXISTS users
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  name TEXT NOT NULL,
+                  email TEXT UNIQUE NOT NULL,
+                  user_type TEXT NOT NULL,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    
+    # CVs table
+    c.execute('''CREATE TABLE IF NOT EXISTS cvs
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  user_id INTEGER,
+                  filename TEXT NOT NULL,
+                  original_filename TEXT NOT NULL,
+                  analysis_result TEXT,
+                  uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                  FOREIGN KEY (user_id) REFERENCES users (id))''')
+    
+    # Schema migrations, tracked with SQLite's user_version
+    version = c.execute("PRAGMA user_version").fetchone()[0]
+    
+    if version < 1:
+        # Full-text index over CV text and skills (rowid = cvs.id)
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS cvs_fts
+                     USING fts5(raw_text, skills, tokenize="unicode61 tokenchars '+#'")''')
+        c.execute('''INSERT INTO cvs_fts (rowid, raw_text, skills)
+                     SELECT id,
+                            json_extract(analysis_result, '$.raw_text'),
+                            (SELECT group_concat(value, ' ')
+                             FROM json_each(analysis_result, '$.skills'))
+                     FROM cvs
+                     WHERE analysis_result IS NOT NULL
+                       AND id NOT IN (SELECT rowid FROM cvs_fts)''')
+    
+    if version < 2:
+        # Score and skills as indexed columns so filters run in SQL
+        c.execute("ALTER TABLE cvs ADD COLUMN score INTEGER")
+        c.execute("CREATE INDEX idx_cvs_score ON cvs (score)")
+        c.execute('''CREATE TABLE cv_skills
+                     (cv_id INTEGER NOT NULL,
+                      skill TEXT NOT NULL,
+                      PRIMARY KEY (cv_id, skill),
+                      FOREIGN KEY (cv_id) REFERENCES cvs (id))''')
+        c.execute("CREATE INDEX idx_cv_skills_skill ON cv_skills (skill)")
+        c.execute('''UPDATE cvs SET score = json_extract(analysis_result, '$.score')
+                     WHERE analysis_result IS NOT NULL''')
+        c.execute('''INSERT OR IGNORE INTO cv_skills (cv_id, skill)
+                     SELECT cvs.id, lower(json_each.value)
+                     FROM cvs, json_each(cvs.analysis_result, '$.skills')
+                     WHERE cvs.analysis_result IS NOT NULL''')
+    
+    if version < 3:
+        # Durable queue for background analysis jobs
+        c.execute('''CREATE TABLE analysis_jobs
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      cv_id INTEGER NOT NULL,
+                      file_path TEXT NOT NULL,
+                      status TEXT NOT NULL DEFAULT 'pending',
+                      error TEXT,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      FOREIGN KEY (cv_id) REFERENCES cvs (id))''')
+        c.execute("CREATE INDEX idx_analysis_jobs_status ON analysis_jobs (status, id)")
+    
+    if version < 4:
+        # Source files already ingested by the bulk importer, so re-runs skip them
+        c.execute('''CREATE TABLE imported_files
+                     (source_path TEXT PRIMARY KEY,
+                      file_size INTEGER NOT NULL,
+                      modified_at REAL NOT NULL,
+                      cv_id INTEGER NOT NULL,
+                      imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      FOREIGN KEY (cv_id) REFERENCES cvs (id))''')
+    
+    if version < 5:
+        # Analyses keyed by file content, so re-uploads skip the analyzer
+        c.execute("ALTER TABLE cvs ADD COLUMN content_hash TEXT")
+        c.execute("CREATE INDEX idx_cvs_content_hash ON cvs (content_hash)")
+        c.execute('''CREATE TABLE analysis_cache
+                     (content_hash TEXT NOT NULL,
+                      analyzer_version INTEGER NOT NULL,
+                      analysis_result TEXT NOT NULL,
+                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      PRIMARY KEY (content_hash, analyzer_version))''')
+    
+    if version < 6:
+        # Extracted text moves out of the analysis JSON into a compressed table,
+        # and the full-text index stops keeping its own copy of it
+        c.execute('''CREATE TABLE cv_texts
+                     (cv_id INTEGER PRIMARY KEY,
+                      text BLOB NOT NULL,
+                      FOREIGN KEY (cv_id) REFERENCES cvs (id))''')
+        c.execute("DROP TABLE IF EXISTS cvs_fts")
+        c.execute('''CREATE VIRTUAL TABLE cvs_fts
+                     USING fts5(raw_text, skills, content='', tokenize="unicode61 tokenchars '+#'")''')
+        
+        rows = c.connection.cursor()
+        rows.execute('''SELECT id, json_extract(analysis_result, '$.raw_text'),
+                               json_extract(analysis_result, '$.skills')
+                        FROM cvs WHERE analysis_result IS NOT NULL''')
+        while True:
+            batch = rows.fetchmany(500)
+            if not batch:
+                break
+            # cv_minhash only exists from version 8; "dedup.py sign" fills it in
+            index_cvs(c, [(cv_id, {'raw_text': text or '', 'skills': json.loads(skills or '[]')})
+                          for cv_id, text, skills in batch], sign=False)
+        
+        for table in ('cvs', 'analysis_cache'):
+            c.execute(f'''UPDATE {table}
+                          SET analysis_result = json_remove(
+                              json_set(analysis_result, '$.text_length',
+                                       length(COALESCE(json_extract(analysis_result, '$.raw_text'), ''))),
+                              '$.raw_text')
+                          WHERE analysis_result IS NOT NULL
+                            AND json_type(analysis_result, '$.raw_text') IS NOT NULL''')
+    
+    if version < 7:
+        # Platform statistics kept up to date by triggers, so /api/stats never scans cvs
+        c.execute('''CREATE TABLE stats_summary
+                     (id INTEGER PRIMARY KEY CHECK (id = 1),
+                      total_cvs INTEGER NOT NULL,
+                      total_users INTEGER NOT NULL,
+                      score_sum INTEGER NOT NULL,
+                      score_count INTEGER NOT NULL)''')
+        c.execute('''CREATE TABLE score_histogram
+                     (bucket INTEGER PRIMARY KEY,
+                      count INTEGER NOT NULL)''')
+        c.execute('''CREATE TABLE skill_counts
+                     (skill TEXT PRIMARY KEY,
+                      count INTEGER NOT NULL)''')
+        c.execute("CREATE INDEX idx_skill_counts_count ON skill_counts (count)")
+        
+        # Ten score buckets: 0-9, 10-19, ..., 90-100
+        bucket = "MIN(COALESCE({row}.score, 0) / 10, 9)"
+        c.execute('''INSERT INTO stats_summary
+                     SELECT 1,
+                            (SELECT COUNT(*) FROM cvs),
+                            (SELECT COUNT(*) FROM users),
+                            (SELECT COALESCE(SUM(score), 0) FROM cvs WHERE analysis_result IS NOT NULL),
+                            (SELECT COUNT(*) FROM cvs WHERE analysis_result IS NOT NULL)''')
+        c.executemany("INSERT INTO score_histogram (bucket, count) VALUES (?, 0)",
+                     [(i,) for i in range(10)])
+        c.execute(f'''UPDATE score_histogram SET count =
+                          (SELECT COUNT(*) FROM cvs
+                           WHERE analysis_result IS NOT NULL
+                             AND {bucket.format(row='cvs')} = score_histogram.bucket)''')
+        c.execute('''INSERT INTO skill_counts (skill, count)
+                     SELECT skill, COUNT(*) FROM cv_skills GROUP BY skill''')
+        
+        # A CV counts towards the score aggregates once its analysis is stored
+        add_score = f'''
+            UPDATE stats_summary SET score_sum = score_sum + COALESCE(NEW.score, 0),
+                                     score_count = score_count + 1
+            WHERE NEW.analysis_result IS NOT NULL;
+            UPDATE score_histogram SET count = count + 1
+            WHERE NEW.analysis_result IS NOT NULL AND bucket = {bucket.format(row='NEW')};'''
+        remove_score = f'''
+            UPDATE stats_summary SET score_sum = score_sum - COALESCE(OLD.score, 0),
+                                     score_count = score_count - 1
+            WHERE OLD.analysis_result IS NOT NULL;
+            UPDATE score_histogram SET count = count - 1
+            WHERE OLD.analysis_result IS NOT NULL AND bucket = {bucket.format(row='OLD')};'''
+        
+        triggers = [
+            f"""CREATE TRIGGER stats_cvs_insert AFTER INSERT ON cvs BEGIN
+                    UPDATE stats_summary SET total_cvs = total_cvs + 1;
+                    {add_score}
+                END""",
+            f"""CREATE TRIGGER stats_cvs_update AFTER UPDATE OF analysis_result, score ON cvs BEGIN
+                    {remove_score}
+                    {add_score}
+                END""",
+            f"""CREATE TRIGGER stats_cvs_delete AFTER DELETE ON cvs BEGIN
+                    UPDATE stats_summary SET total_cvs = total_cvs - 1;
+                    {remove_score}
+                END""",
+            """CREATE TRIGGER stats_users_insert AFTER INSERT ON users BEGIN
+                   UPDATE stats_summary SET total_users = total_users + 1;
+               END""",
+            """CREATE TRIGGER stats_users_delete AFTER DELETE ON users BEGIN
+                   UPDATE stats_summary SET total_users = total_users - 1;
+               END""",
+            """CREATE TRIGGER stats_skills_insert AFTER INSERT ON cv_skills BEGIN
+                   INSERT INTO skill_counts (skill, count) VALUES (NEW.skill, 1)
+                   ON CONFLICT (skill) DO UPDATE SET count = count + 1;
+               END""",
+            """CREATE TRIGGER stats_skills_delete AFTER DELETE ON cv_skills BEGIN
+                   UPDATE skill_counts SET count = count - 1 WHERE skill = OLD.skill;
+               END""",
+        ]
+        for trigger in triggers:
+            c.execute(trigger)
+    
+    if version < 8:
+        # MinHash signatures for near-duplicate detection; CVs indexed before
+        # this are signed by "python dedup.py sign"
+        c.execute('''CREATE TABLE cv_minhash
+                     (cv_id INTEGER PRIMARY KEY,
+                      signature BLOB NOT NULL,
+                      FOREIGN KEY (cv_id) REFERENCES cvs (id))''')
+    
+    if version < 9:
+        # Analyzer version of each stored analysis, so reanalyze.py can find
+        # stale rows; NULL means it was analyzed before versions were recorded
+        c.execute("ALTER TABLE cvs ADD COLUMN analyzer_version INTEGER")
+        c.execute("CREATE INDEX idx_cvs_analyzer_version ON cvs (analyzer_version)")
+        # CVs whose analysis changed after they were first indexed, in order,
+        # so in-memory indexes can re-read them
+        c.execute('''CREATE TABLE cv_updates
+                     (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                      cv_id INTEGER NOT NULL)''')
+        # Resume point of an interrupted re-analysis, per target version
+        c.execute('''CREATE TABLE reanalysis_checkpoints
+                     (analyzer_version INTEGER PRIMARY KEY,
+                      last_cv_id INTEGER NOT NULL,
+                      updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    
+    if version < 10:
+        # Machine-readable reason a job failed, e.g. 'timeout' (see ExtractionError)
+        c.execute("ALTER TABLE analysis_jobs ADD COLUMN error_code TEXT")
+    
+    if version < 11:
+        # Whether an update changed the extracted text, which only the match
+        # index needs to re-read
+        c.execute("ALTER TABLE cv_updates ADD COLUMN text_changed INTEGER NOT NULL DEFAULT 1")
+    
+    c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+def analysis_json(analysis):
+    """Serialize an analysis for storage, leaving out the extracted text"""
+    return json.dumps({key: value for key, value in analysis.items() if key != 'raw_text'})
+
+def compress_text(text):
+    return zlib.compress(text.encode('utf-8'))
+
+def decompress_text(blob):
+    return zlib.decompress(blob).decode('utf-8')
+
+def index_cv(c, cv_id, analysis):
+    """Store a CV's text and add its skills and text to the search indexes"""
+    index_cvs(c, [(cv_id, analysis)])
+
+def index_cvs(c, items, sign=True):
+    """Store text and index many (cv_id, analysis) pairs in bulk, with the
+    MinHash signature of each text unless sign is False"""
+    c.executemany("INSERT OR IGNORE INTO cv_skills (cv_id, skill) VALUES (?, ?)",
+                 [(cv_id, skill.lower()) for cv_id, analysis in items
+                  for skill in analysis.get('skills', [])])
+    c.executemany("INSERT OR REPLACE INTO cv_texts (cv_id, text) VALUES (?, ?)",
+                 [(cv_id, compress_text(analysis.get('raw_text', ''))) for cv_id, analysis in items])
+    c.executemany("INSERT INTO cvs_fts (rowid, raw_text, skills) VALUES (?, ?, ?)",
+                 [(cv_id, analysis.get('raw_text', ''), ' '.join(analysis.get('skills', [])))
+                  for cv_id, analysis in items])
+    
+    if not sign:
+        return
+    from dedup import signature, to_blob  # numpy is only imported once CVs are indexed
+    signatures = [(cv_id, signature(analysis.get('raw_text', ''))) for cv_id, analysis in items]
+    c.executemany("INSERT OR REPLACE INTO cv_minhash (cv_id, signature) VALUES (?, ?)",
+                 [(cv_id, to_blob(sig)) for cv_id, sig in signatures if sig is not None])
+
+def save_analysis(c, cv_id, analysis):
+    """Store a finished analysis on an existing CV row and index it"""
+    c.execute("UPDATE cvs SET analysis_result = ?, score = ?, analyzer_version = ? WHERE id = ?",
+             (analysis_json(analysis), analysis['score'], ANALYZER_VERSION, cv_id))
+    index_cv(c, cv_id, analysis)
+
+def replace_analysis(c, cv_id, analysis, old_analysis, old_text):
+    """Swap an indexed CV's analysis for a new one.
+    
+    The contentless full-text index can only forget a row given the exact
+    values it was indexed with, hence old_analysis and old_text."""
+    c.execute("INSERT INTO cvs_fts (cvs_fts, rowid, raw_text, skills) VALUES ('delete', ?, ?, ?)",
+             (cv_id, old_text, ' '.join(old_analysis.get('skills', []))))
+    c.execute("DELETE FROM cv_skills WHERE cv_id = ?", (cv_id,))
+    c.execute("DELETE FROM cv_minhash WHERE cv_id = ?", (cv_id,))
+    save_analysis(c, cv_id, analysis)
+    c.execute("INSERT INTO cv_updates (cv_id, text_changed) VALUES (?, ?)",
+             (cv_id, analysis.get('raw_text', '') != old_text))
+
+def get_cached_analysis(c, content_hash):
+    """Return the stored analysis for this file content and analyzer version, if any.
+    
+    The extracted text is reattached from a CV that has the same content."""
+    c.execute("""SELECT analysis_cache.analysis_result, cv_texts.text
+                 FROM analysis_cache
+                 JOIN cvs ON cvs.content_hash = analysis_cache.content_hash
+                 JOIN cv_texts ON cv_texts.cv_id = cvs.id
+                 WHERE analysis_cache.content_hash = ? AND analysis_cache.analyzer_version = ?
+                 LIMIT 1""", (content_hash, ANALYZER_VERSION))
+    row = c.fetchone()
+    if not row:
+        return None
+    
+    analysis = json.loads(row[0])
+    analysis['raw_text'] = decompress_text(row[1])
+    return analysis
+
+def cache_analysis(c, content_hash, analysis):
+    """Remember an analysis for this file content and the current analyzer version"""
+    c.execute("INSERT OR REPLACE INTO analysis_cache (content_hash, analyzer_version, analysis_result) VALUES (?, ?, ?)",
+             (content_hash, ANALYZER_VERSION, analysis_json(analysis)))
+
+class RefreshCursor:
+    """How far an in-memory index built from the database has read it.
+    
+    The skill, duplicate and match indexes each keep one. New CVs are read past
+    a watermark that never passes a CV still waiting for its analysis, and
+    re-analyzed CVs are found in the cv_updates log."""
+    
+    def __init__(self):
+        # Every CV with an id up to the watermark has been considered
+        self.watermark = 0
+        # Last cv_updates entry applied
+        self.update_seq = 0
+    
+    def updated(self, conn, is_indexed, text_changed=False):
+        """Return {cv_id: latest cv_updates seq} for the CVs re-analyzed since
+        the last call that the index must re-read, in id order.
+        
+        That is every one it holds, and every one up to the watermark: a CV
+        left out before may qualify now. The others are still to come from
+        new_rows(). With text_changed, only updates that changed the text count."""
+        rows = conn.execute("SELECT seq, cv_id, text_changed FROM cv_updates WHERE seq > ? ORDER BY seq",
+                            (self.update_seq,)).fetchall()
+        if rows:
+            self.update_seq = rows[-1][0]
+        latest = {cv_id: seq for seq, cv_id, changed in rows if changed or not text_changed}
+        return {cv_id: latest[cv_id] for cv_id in sorted(latest)
+                if cv_id <= self.watermark or is_indexed(cv_id)}
+    
+    def new_rows(self, conn, sql, chunk_size=1000):
+        """Yield lists of up to chunk_size rows of sql, then move the watermark.
+        
+        sql must select the CV id first, take the watermark as its only
+        parameter (cv_id > ?) and order by id. Rows of CVs that are already
+        indexed may come back; callers skip them."""
+        # CVs still waiting for a queued analysis have no skills, score or text
+        # yet, so the watermark may not pass them
+        first_pending = conn.execute("SELECT MIN(cv_id) FROM analysis_jobs "
+                                     "WHERE status IN ('pending', 'running')").fetchone()[0]
+        c = conn.cursor()
+        try:
+            c.execute(sql, (self.watermark,))
+            last_id = self.watermark
+            for rows in iter(lambda: c.fetchmany(chunk_size), []):
+                last_id = rows[-1][0]
+                yield rows
+        finally:
+            c.close()
+        self.watermark = last_id if first_pending is None else min(last_id, first_pending - 1)
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""Near-duplicate CV detection with MinHash signatures and LSH banding.
+
+Signatures are computed from the extracted text when a CV is indexed and
+stored in cv_minhash as NUM_PERM little-endian uint32 values. Usage:
+
+    python dedup.py sign                       # sign CVs indexed before signatures existed
+    python dedup.py report -o duplicates.jsonl # every duplicate cluster in the corpus
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import numpy as np
+
+from database import RefreshCursor, connect, init_db, decompress_text
+
+NUM_PERM = 128  # MinHash permutations per signature
+BANDS = 16  # LSH bands of ROWS values; pairs above ~0.7 similarity share a band
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 3  # Words per shingle
+DUPLICATE_THRESHOLD = 0.8  # Estimated Jaccard similarity that counts as a duplicate
+SORT_AFTER = 4096  # Unsorted new CVs tolerated before the band index is re-sorted
+CHUNK_SIZE = 2000  # CVs read per query by the sign and report commands
+
+WORD_PATTERN = re.compile(r'\w+')
+
+# Fixed seeds so signatures stay comparable across processes and restarts
+_rng = np.random.default_rng(20240611)
+_MULTIPLIERS = _rng.integers(1, 2 ** 63, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_OFFSETS = _rng.integers(0, 2 ** 63, NUM_PERM, dtype=np.uint64)
+_BAND_MULTIPLIERS = (_rng.integers(1, 2 ** 31, ROWS, dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+
+def shingles(text):
+    """Hash every SHINGLE_SIZE-word window of text to 32 bits"""
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return np.zeros(0, dtype=np.uint64)
+    return np.fromiter({zlib.crc32(' '.join(words[i:i + SHINGLE_SIZE]).encode('utf-8'))
+                        for i in range(len(words) - SHINGLE_SIZE + 1)}, dtype=np.uint64)
+
+def signature(text):
+    """MinHash signature of text as a uint32 array, or None when it is too short"""
+    hashes = shingles(text)
+    if not len(hashes):
+        return None
+    # Multiply-shift hashing: the top 32 bits of a*x + b (mod 2**64)
+    permuted = (_MULTIPLIERS[:, None] * hashes[None, :] + _OFFSETS[:, None]) >> np.uint64(32)
+    return permuted.min(axis=1).astype(np.uint32)
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of the texts behind two signatures"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+def band_keys(signatures):
+    """Hash each band of an (n, NUM_PERM) signature matrix to a uint32 key"""
+    bands = signatures.reshape(len(signatures), BANDS, ROWS).astype(np.uint64)
+    return ((bands * _BAND_MULTIPLIERS).sum(axis=2) >> np.uint64(32)).astype(np.uint32)
+
+def to_blob(sig):
+    return sig.astype('<u4').tobytes()
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype='<u4')
+
+class DuplicateIndex:
+    """LSH band index over every signed CV.
+
+    Only band keys are kept in memory (BANDS uint32 per CV); candidate
+    signatures are read back from cv_minhash to confirm a match. Per band, a
+    sorted copy of the keys answers lookups by binary search, and CVs added
+    since the last sort are scanned directly. A re-analyzed CV is appended
+    again with its new keys; its old row only yields candidates that fail
+    confirmation, and is dropped at the next sort."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Rows are appended into spare capacity; the first `count` are in use
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.keys = np.zeros((0, BANDS), dtype=np.uint32)
+        self.count = 0
+        self.indexed = set()
+        # Band-major sorted keys and the row of each, covering the first `sorted` rows
+        self.sorted_keys = np.zeros((BANDS, 0), dtype=np.uint32)
+        self.sorted_rows = np.zeros((BANDS, 0), dtype=np.int64)
+        self.sorted = 0
+        self.cursor = RefreshCursor()
+
+    def refresh(self, conn):
+        """Add every CV signed since the last refresh and re-read re-analyzed ones"""
+        with self.lock:
+            updated = list(self.cursor.updated(conn, self.indexed.__contains__))
+            signatures = load_signatures(conn, updated)
+            if signatures:
+                self._append(list(signatures), np.stack([sig for sig, _ in signatures.values()]))
+
+            # Room for every new signature up front, so chunks are copied in place
+            new_count = conn.execute("SELECT COUNT(*) FROM cv_minhash WHERE cv_id > ?",
+                                     (self.cursor.watermark,)).fetchone()[0]
+            self._reserve(self.count + new_count)
+            sql = "SELECT cv_id, signature FROM cv_minhash WHERE cv_id > ? ORDER BY cv_id"
+            for rows in self.cursor.new_rows(conn, sql, CHUNK_SIZE):
+                new = [row for row in rows if row[0] not in self.indexed]
+                if new:
+                    self._append([row[0] for row in new], np.stack([from_blob(row[1]) for row in new]))
+
+            if self.count - self.sorted > SORT_AFTER:
+                self._sort()
+
+    def _reserve(self, size):
+        """Make room for size rows, at least doubling the capacity when it grows"""
+        if size <= len(self.ids):
+            return
+        capacity = max(size, 2 * len(self.ids), 1024)
+        ids = np.zeros(capacity, dtype=np.int64)
+        keys = np.zeros((capacity, BANDS), dtype=np.uint32)
+        ids[:self.count] = self.ids[:self.count]
+        keys[:self.count] = self.keys[:self.count]
+        self.ids, self.keys = ids, keys
+
+    def _append(self, cv_ids, signatures):
+        self._reserve(self.count + len(cv_ids))
+        end = self.count + len(cv_ids)
+        self.ids[self.count:end] = cv_ids
+        self.keys[self.count:end] = band_keys(signatures)
+        self.count = end
+        self.indexed.update(cv_ids)
+
+    def _sort(self):
+        # Keep only the latest row of each CV
+        _, last = np.unique(self.ids[:self.count][::-1], return_index=True)
+        keep = np.sort(self.count - 1 - last)
+        self.count = len(keep)
+        self.ids[:self.count] = self.ids[keep]
+        self.keys[:self.count] = self.keys[keep]
+        keys = self.keys[:self.count].T
+        self.sorted_rows = np.argsort(keys, axis=1, kind='stable')
+        self.sorted_keys = np.take_along_axis(keys, self.sorted_rows, axis=1)
+        self.sorted = self.count
+
+    def candidates(self, keys):
+        """Ids of the CVs sharing at least one band key with keys"""
+        with self.lock:
+            rows = [np.flatnonzero((self.keys[self.sorted:self.count] == keys).any(axis=1)) + self.sorted]
+            for band in range(BANDS):
+                start = np.searchsorted(self.sorted_keys[band], keys[band], 'left')
+                end = np.searchsorted(self.sorted_keys[band], keys[band], 'right')
+                rows.append(self.sorted_rows[band, start:end])
+            return np.unique(self.ids[np.concatenate(rows)]).tolist()
+
+    def duplicates(self, conn, cv_ids, threshold=DUPLICATE_THRESHOLD):
+        """Map each of cv_ids to its near-duplicates as [(id, similarity, score)], closest first"""
+        signatures = load_signatures(conn, cv_ids)
+        candidates = {cv_id: [other for other in self.candidates(band_keys(sig[None, :])[0]) if other != cv_id]
+                      for cv_id, (sig, _) in signatures.items()}
+        others = load_signatures(conn, sorted({other for ids in candidates.values() for other in ids}))
+
+        result = {}
+        for cv_id, ids in candidates.items():
+            found = []
+            for other in ids:
+                if other in others:
+                    other_sig, other_score = others[other]
+                    score = similarity(signatures[cv_id][0], other_sig)
+                    if score >= threshold:
+                        found.append((other, round(score, 3), other_score or 0))
+            found.sort(key=lambda item: (-item[1], item[0]))
+            result[cv_id] = found
+        return result
+
+def load_signatures(conn, cv_ids):
+    """Return {cv_id: (signature, score)} for the signed CVs among cv_ids"""
+    found = {}
+    c = conn.cursor()
+    for start in range(0, len(cv_ids), 500):
+        chunk = list(cv_ids[start:start + 500])
+        placeholders = ', '.join('?' * len(chunk))
+        c.execute(f"""SELECT cv_minhash.cv_id, cv_minhash.signature, cvs.score
+                      FROM cv_minhash
+                      JOIN cvs ON cvs.id = cv_minhash.cv_id
+                      WHERE cv_minhash.cv_id IN ({placeholders})""", chunk)
+        for cv_id, blob, score in c.fetchall():
+            found[cv_id] = (from_blob(blob), score)
+    return found
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_duplicate_index():
+    """Return the process-wide duplicate index, created empty on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = DuplicateIndex()
+        return _index
+
+# --- Command line ---
+
+def sign_missing(conn):
+    """Sign every CV with stored text but no signature; returns how many were signed"""
+    c = conn.cursor()
+    signed = 0
+    last_id = 0
+    while True:
+        c.execute("""SELECT cv_texts.cv_id, cv_texts.text FROM cv_texts
+                     LEFT JOIN cv_minhash ON cv_minhash.cv_id = cv_texts.cv_id
+                     WHERE cv_minhash.cv_id IS NULL AND cv_texts.cv_id > ?
+                     ORDER BY cv_texts.cv_id LIMIT ?""", (last_id, CHUNK_SIZE))
+        rows = c.fetchall()
+        if not rows:
+            return signed
+        values = []
+        for cv_id, text in rows:
+            sig = signature(decompress_text(text))
+            if sig is not None:
+                values.append((cv_id, to_blob(sig)))
+        c.executemany("INSERT OR REPLACE INTO cv_minhash (cv_id, signature) VALUES (?, ?)", values)
+        conn.commit()
+        signed += len(values)
+        last_id = rows[-1][0]
+
+def _root(parent, row):
+    while parent[row] != row:
+        row = parent[row]
+    return row
+
+def _runs(sorted_values):
+    """(start, end) of each run of two or more equal values in a sorted array"""
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(sorted_values)) + 1, [len(sorted_values)]])
+    for run in np.flatnonzero(np.diff(bounds) > 1):
+        yield bounds[run], bounds[run + 1]
+
+def report(conn, output, threshold=DUPLICATE_THRESHOLD):
+    """Write every cluster of near-duplicate CVs to output as JSON lines.
+
+    Signatures and band keys are spilled to memory-mapped temporary files, so
+    memory holds one band's keys (12 bytes per CV) plus the cluster array
+    whatever the corpus size. Returns (CVs, clusters, CVs in clusters)."""
+    c = conn.cursor()
+    total = c.execute("SELECT COUNT(*) FROM cv_minhash").fetchone()[0]
+    if not total:
+        return 0, 0, 0
+
+    with tempfile.TemporaryDirectory(prefix='cv_dedup_') as workdir:
+        ids = np.lib.format.open_memmap(os.path.join(workdir, 'ids.npy'), 'w+', np.int64, (total,))
+        signatures = np.lib.format.open_memmap(os.path.join(workdir, 'signatures.npy'), 'w+', np.uint32, (total, NUM_PERM))
+        keys = np.lib.format.open_memmap(os.path.join(workdir, 'keys.npy'), 'w+', np.uint32, (BANDS, total))
+
+        # One pass over the table, CHUNK_SIZE rows at a time
+        count = 0
+        last_id = 0
+        while count < total:
+            c.execute("SELECT cv_id, signature FROM cv_minhash WHERE cv_id > ? ORDER BY cv_id LIMIT ?",
+                      (last_id, min(CHUNK_SIZE, total - count)))
+            rows = c.fetchall()
+            if not rows:
+                break
+            chunk = np.stack([from_blob(row[1]) for row in rows])
+            ids[count:count + len(rows)] = [row[0] for row in rows]
+            signatures[count:count + len(rows)] = chunk
+            keys[:, count:count + len(rows)] = band_keys(chunk).T
+            count += len(rows)
+            last_id = rows[-1][0]
+
+        # Band by band, compare every pair of CVs in a bucket and link the ones
+        # that are similar enough; parent[i] < i points into i's cluster
+        parent = np.arange(count, dtype=np.int64)
+        for band in range(BANDS):
+            order = np.argsort(keys[band, :count], kind='stable')
+            for start, end in _runs(keys[band, :count][order]):
+                bucket = order[start:end]
+                bucket_signatures = signatures[bucket]
+                for i in range(len(bucket) - 1):
+                    rest = bucket[i + 1:]
+                    similar = (bucket_signatures[i + 1:] == bucket_signatures[i]).sum(axis=1) >= threshold * NUM_PERM
+                    for row in rest[similar]:
+                        # Union by smallest row, so every root is its cluster's minimum
+                        a, b = _root(parent, bucket[i]), _root(parent, row)
+                        parent[max(a, b)] = min(a, b)
+
+        # Point every row straight at its root
+        while True:
+            grandparent = parent[parent]
+            if np.array_equal(grandparent, parent):
+                break
+            parent = grandparent
+
+        order = np.argsort(parent, kind='stable')
+        found = in_clusters = 0
+        for start, end in _runs(parent[order]):
+            cluster_ids = sorted(int(i) for i in ids[order[start:end]])
+            output.write(json.dumps({'cv_ids': cluster_ids, 'size': len(cluster_ids)}) + '\n')
+            found += 1
+            in_clusters += len(cluster_ids)
+        return count, found, in_clusters
+
+def main():
+    parser = argparse.ArgumentParser(description='Find near-duplicate CVs')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('sign', help='Compute missing MinHash signatures')
+    report_parser = subcommands.add_parser('report', help='Write every near-duplicate cluster as JSON lines')
+    report_parser.add_argument('-o', '--output', help='Output file (default: stdout)')
+    report_parser.add_argument('--threshold', type=float, default=DUPLICATE_THRESHOLD,
+                               help='Estimated Jaccard similarity that counts as a duplicate')
+    args = parser.parse_args()
+
+    init_db()
+    conn = connect()
+    try:
+        started = time.perf_counter()
+        signed = sign_missing(conn)
+        print(f"✍️  Signed {signed} CV(s) in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        if args.command == 'report':
+            output = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+            try:
+                total, clusters, members = report(conn, output, args.threshold)
+            finally:
+                if args.output:
+                    output.close()
+            print(f"🔎 {total} CV(s): {clusters} duplicate cluster(s) covering {members} CV(s) "
+                  f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
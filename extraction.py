@@ -0,0 +1,191 @@
+import os
+import queue
+import threading
+import time
+
+import metrics
+
+# Defaults for ExtractionPool; the web app overrides them from its config
+TIMEOUT = 30  # Seconds one PDF may take before its worker is killed
+MEMORY_LIMIT_MB = 512  # Address space cap of each worker process
+MAX_JOBS = 100  # PDFs a worker extracts before it is replaced
+
+class ExtractionError(Exception):
+    """Text could not be extracted from a PDF.
+
+    code says why: 'invalid_pdf' (PyPDF2 could not read it), 'timeout',
+    'memory' (the worker hit its memory cap) or 'crashed' (the worker died)."""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+def iter_pdf_pages(pdf_path, max_pages, max_chars):
+    """Yield the text of each PDF page, stopping at the page and character budgets"""
+    # Imported on first use: PyPDF2 is slow to import and most processes
+    # (search, stats) never parse a PDF
+    import PyPDF2
+
+    try:
+        with open(pdf_path, 'rb') as file:
+            pdf_reader = PyPDF2.PdfReader(file)
+            remaining = max_chars
+            for page_number, page in enumerate(pdf_reader.pages):
+                if page_number >= max_pages or remaining <= 0:
+                    return
+                text = page.extract_text()[:remaining]
+                remaining -= len(text)
+                yield text
+    except (MemoryError, ExtractionError):
+        raise
+    except Exception as e:
+        raise ExtractionError('invalid_pdf', f'Could not read the PDF: {e}') from e
+
+def _worker_main(conn, memory_limit, max_pages, max_chars):
+    """Extract the PDFs whose paths arrive on conn until None or EOF arrives"""
+    if memory_limit:
+        try:
+            import resource
+        except ImportError:  # Windows has no rlimits: workers run uncapped there
+            pass
+        else:
+            resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+    # A job's timeout runs from when it is sent, so this should be done by
+    # then: the fork server preloads PyPDF2 and start() starts workers early
+    import PyPDF2
+
+    while True:
+        try:
+            pdf_path = conn.recv()
+        except EOFError:
+            return
+        if pdf_path is None:
+            return
+
+        try:
+            conn.send(('ok', list(iter_pdf_pages(pdf_path, max_pages, max_chars))))
+        except ExtractionError as e:
+            conn.send(('error', e.code, str(e)))
+        except MemoryError:
+            # The heap may be in any state now; report and let the pool replace us
+            conn.send(('error', 'memory', 'PDF extraction exceeded the memory limit'))
+            return
+
+class _Worker:
+    def __init__(self, context, memory_limit, max_pages, max_chars):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, name='pdf-extraction',
+                                       args=(child_conn, memory_limit, max_pages, max_chars),
+                                       daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+
+    def stop(self):
+        """Ask the worker to exit once it is idle"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.conn.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join(1)
+        self.conn.close()
+
+class ExtractionPool:
+    """A pool of worker processes that extract PDF text.
+
+    A PDF that hangs or balloons in PyPDF2 only takes down its own worker:
+    each job has a wall-clock timeout, each worker an address-space cap, and
+    workers are replaced after max_jobs PDFs so slow leaks cannot build up.
+    Workers are started by start(), or else on first use, and reused across
+    requests; extract() is safe to call from many threads, each waiting for
+    a free worker."""
+
+    def __init__(self, size, timeout=TIMEOUT, memory_limit_mb=MEMORY_LIMIT_MB, max_jobs=MAX_JOBS,
+                 max_pages=None, max_chars=None):
+        from analyzer import MAX_PAGES, MAX_CHARS
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.max_jobs = max_jobs
+        self.max_pages = MAX_PAGES if max_pages is None else max_pages
+        self.max_chars = MAX_CHARS if max_chars is None else max_chars
+        self.context = None
+        self.context_lock = threading.Lock()
+        # A free slot holds an idle worker, or None until one is started in it
+        self.idle = queue.Queue()
+        for _ in range(size):
+            self.idle.put(None)
+
+    def _start_worker(self):
+        with self.context_lock:
+            if self.context is None:
+                import multiprocessing
+                # Forking a threaded web process is unsafe; the fork server is a
+                # clean single-threaded process that forks workers cheaply
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    self.context = multiprocessing.get_context('forkserver')
+                    self.context.set_forkserver_preload(['__main__', 'PyPDF2', 'extraction'])
+                else:
+                    self.context = multiprocessing.get_context('spawn')
+        return _Worker(self.context, self.memory_limit, self.max_pages, self.max_chars)
+
+    def start(self):
+        """Start a worker in every free slot that has none"""
+        for _ in range(self.size):
+            worker = self.idle.get()
+            try:
+                if worker is None:
+                    worker = self._start_worker()
+            finally:
+                self.idle.put(worker)
+
+    def extract(self, pdf_path):
+        """Return the text of each page of a PDF, or raise ExtractionError"""
+        started = time.perf_counter()
+        worker = self.idle.get()
+        try:
+            if worker is None or not worker.process.is_alive():
+                worker = self._start_worker()
+            try:
+                worker.conn.send(os.path.abspath(pdf_path))
+                if not worker.conn.poll(self.timeout):
+                    worker.kill()
+                    worker = None
+                    raise ExtractionError('timeout', f'PDF extraction took longer than {self.timeout} seconds')
+                result = worker.conn.recv()
+            except (EOFError, OSError):
+                worker.process.join(1)
+                reason = worker.process.exitcode
+                worker.kill()
+                worker = None
+                reason = f'signal {-reason}' if reason is not None and reason < 0 else f'exit status {reason}'
+                raise ExtractionError('crashed', f'PDF extraction worker died ({reason})')
+
+            worker.jobs += 1
+            if result[0] == 'error' and result[1] == 'memory':
+                worker.process.join(1)
+                worker.conn.close()
+                worker = None
+            elif worker.jobs >= self.max_jobs:
+                worker.stop()
+                worker = None
+        finally:
+            # The slot is handed back even when its worker had to go
+            self.idle.put(worker)
+
+        if metrics.enabled:
+            metrics.analyzer_seconds.observe(('extract',), time.perf_counter() - started)
+        if result[0] == 'error':
+            raise ExtractionError(result[1], result[2])
+        return result[1]
+
+    def close(self):
+        """Stop the idle workers; busy ones finish their job first"""
+        for _ in range(self.size):
+            worker = self.idle.get()
+            if worker is not None:
+                worker.stop()
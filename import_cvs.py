@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Smart CV Management Platform - Bulk Importer
+Analyze every PDF CV in a folder and store the results in the database.
+
+Usage: python import_cvs.py /path/to/cvs [--workers 8] [--batch-size 200]
+
+Files already imported (same path, size and modification time) are skipped,
+so an interrupted import can simply be run again.
+"""
+
+import argparse
+import multiprocessing
+import os
+import time
+
+from werkzeug.utils import secure_filename
+
+from analyzer import ANALYZER_VERSION, get_analyzer
+from storage import store_upload
+from database import connect, init_db, index_cvs, analysis_json, cache_analysis
+
+def init_worker():
+    # Build the shared analyzer (and its skill regex) before the first file arrives
+    get_analyzer()
+
+def analyze_file(job):
+    """Analyze one PDF in a worker process"""
+    path, size, mtime = job
+    try:
+        analysis = get_analyzer().analyze_cv(path)
+    except Exception as e:
+        return path, size, mtime, None, 0, str(e)
+    return path, size, mtime, analysis, analysis['page_count'], None
+
+def find_pdfs(directory):
+    """Yield (path, size, mtime) for every PDF under directory"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith('.pdf'):
+                path = os.path.abspath(os.path.join(root, name))
+                stat = os.stat(path)
+                yield path, stat.st_size, stat.st_mtime
+
+def load_imported(conn):
+    """Return {source_path: (size, mtime)} for files imported by earlier runs"""
+    c = conn.cursor()
+    c.execute("SELECT source_path, file_size, modified_at FROM imported_files")
+    return {row[0]: (row[1], row[2]) for row in c.fetchall()}
+
+def write_batch(conn, batch, upload_folder, user_name):
+    """Store a batch of analyzed files in a single transaction"""
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+
+    # Create users for the emails found in the CVs
+    emails = sorted({analysis['contact']['email'] or '' for _, _, _, analysis in batch})
+    c.executemany("INSERT OR IGNORE INTO users (name, email, user_type) VALUES (?, ?, ?)",
+                 [(user_name, email, 'student') for email in emails])
+    placeholders = ', '.join('?' * len(emails))
+    c.execute(f"SELECT email, id FROM users WHERE email IN ({placeholders})", emails)
+    user_ids = dict(c.fetchall())
+
+    # Assign CV ids up front so every table can be written with executemany;
+    # BEGIN IMMEDIATE holds the write lock, so nobody else can take them
+    c.execute("""SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'cvs'), 0),
+                            COALESCE((SELECT MAX(id) FROM cvs), 0))""")
+    next_id = c.fetchone()[0] + 1
+
+    cv_rows = []
+    imported_rows = []
+    indexed = []
+    for cv_id, (path, size, mtime, analysis) in enumerate(batch, start=next_id):
+        filename = secure_filename(os.path.basename(path))
+        # Stored by content hash like uploads, so later uploads of the same file reuse the analysis
+        with open(path, 'rb') as stream:
+            content_hash, unique_filename = store_upload(stream, upload_folder)
+        cache_analysis(c, content_hash, analysis)
+
+        user_id = user_ids.get(analysis['contact']['email'] or '')
+        cv_rows.append((cv_id, user_id, unique_filename, filename, analysis_json(analysis), analysis['score'],
+                        content_hash, ANALYZER_VERSION))
+        imported_rows.append((path, size, mtime, cv_id))
+        indexed.append((cv_id, analysis))
+
+    c.executemany("INSERT INTO cvs (id, user_id, filename, original_filename, analysis_result, score, content_hash, analyzer_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 cv_rows)
+    index_cvs(c, indexed)
+    c.executemany("INSERT OR REPLACE INTO imported_files (source_path, file_size, modified_at, cv_id) VALUES (?, ?, ?, ?)",
+                 imported_rows)
+
+    conn.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import a folder of PDF CVs')
+    parser.add_argument('directory', help='Folder to scan (recursively) for PDF files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                        help='Analysis processes (default: number of CPUs)')
+    parser.add_argument('--batch-size', type=int, default=200,
+                        help='CVs written per database transaction (default: 200)')
+    parser.add_argument('--upload-folder', default='uploads',
+                        help='Where imported PDFs are copied (default: uploads)')
+    parser.add_argument('--user-name', default='Anonymous',
+                        help='Name for users created from CV email addresses')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        parser.error(f'{args.directory} is not a directory')
+
+    os.makedirs(args.upload_folder, exist_ok=True)
+    init_db()
+    conn = connect()
+
+    imported = load_imported(conn)
+    found = list(find_pdfs(args.directory))
+    jobs = [job for job in found if imported.get(job[0]) != (job[1], job[2])]
+    skipped = len(found) - len(jobs)
+
+    print("=" * 70)
+    print(f"📂 {len(jobs)} PDF(s) to import from {args.directory}")
+    if skipped:
+        print(f"⏭️  {skipped} already imported, skipping")
+    print(f"⚙️  {args.workers} worker process(es), batches of {args.batch_size}")
+    print("=" * 70)
+
+    done = failed = pages = 0
+    batch = []
+    started = time.monotonic()
+
+    def report():
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"📥 {done}/{len(jobs)} files | {done / elapsed:.1f} files/s | "
+              f"{pages / elapsed:.1f} pages/s | {failed} failed")
+
+    with multiprocessing.Pool(args.workers, initializer=init_worker) as pool:
+        for path, size, mtime, analysis, page_count, error in pool.imap_unordered(analyze_file, jobs, chunksize=4):
+            done += 1
+            if error:
+                failed += 1
+                print(f"❌ {path}: {error}")
+                continue
+
+            pages += page_count
+            batch.append((path, size, mtime, analysis))
+            if len(batch) >= args.batch_size:
+                write_batch(conn, batch, args.upload_folder, args.user_name)
+                batch = []
+                report()
+
+    if batch:
+        write_batch(conn, batch, args.upload_folder, args.user_name)
+    conn.close()
+
+    report()
+    print("✅ Import finished")
+
+if __name__ == '__main__':
+    main()
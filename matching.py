@@ -0,0 +1,536 @@
+import contextlib
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+
+from database import RefreshCursor, connect, decompress_text
+
+try:
+    import fcntl
+except ImportError:  # Windows locks a byte of the lock file instead
+    fcntl = None
+    import msvcrt
+
+MATCH_INDEX_DIR = 'match_index'
+SEGMENT_SIZE = 512  # CVs buffered in memory before they are written as a segment
+MERGE_FACTOR = 4  # Adjacent segments of one size tier merged together
+MAX_MERGED_SIZE = 1_000_000  # CVs beyond which segments are no longer merged
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r'[\w+#]+')
+STOPWORDS = frozenset('''
+    a about above after all also an and any are as at be been being but by can could did do
+    does for from had has have having he her his how i if in into is it its may me more most
+    must my no not of on or our out over own she should so some such than that the their them
+    then there these they this those through to under until up very was we were what when
+    where which while who whom why will with would you your
+'''.split())
+
+log = logging.getLogger('cv_platform.matching')
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower())
+            if token not in STOPWORDS and (len(token) > 1 or not token.isalpha())]
+
+class Segment:
+    """Immutable term-major (CSC) slice of the BM25 term-frequency matrix.
+
+    Postings for term t are doc_idx[term_ptr[t]:term_ptr[t + 1]], with matching
+    term frequencies in tf; doc_idx indexes doc_ids, doc_lens and doc_versions.
+    A CV's version is the cv_updates entry its text was read after (0 for its
+    first text); a row is dead when another holds a newer version of the CV."""
+
+    ARRAYS = ('term_ptr', 'doc_idx', 'tf', 'doc_ids', 'doc_lens', 'doc_versions')
+
+    def __init__(self, term_ptr, doc_idx, tf, doc_ids, doc_lens, doc_versions, name=None):
+        self.term_ptr = term_ptr
+        self.doc_idx = doc_idx
+        self.tf = tf
+        self.doc_ids = doc_ids
+        self.doc_lens = doc_lens
+        self.doc_versions = doc_versions
+        self.name = name
+        # Boolean mask of dead rows, set by MatchIndex; None when all are live
+        self.dead = None
+
+    @classmethod
+    def build(cls, docs, vocab_size):
+        """Build a segment from (cv_id, {term_id: count}, length, version) tuples"""
+        terms = np.fromiter((t for _, counts, _, _ in docs for t in counts), dtype=np.int64)
+        rows = np.repeat(np.arange(len(docs), dtype=np.int32),
+                         [len(counts) for _, counts, _, _ in docs])
+        tf = np.fromiter((n for _, counts, _, _ in docs for n in counts.values()), dtype=np.float32)
+
+        order = np.argsort(terms, kind='stable')
+        term_ptr = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=term_ptr[1:])
+
+        return cls(term_ptr, rows[order], tf[order],
+                   np.array([cv_id for cv_id, _, _, _ in docs], dtype=np.int64),
+                   np.array([length for _, _, length, _ in docs], dtype=np.int32),
+                   np.array([version for _, _, _, version in docs], dtype=np.int64))
+
+    @classmethod
+    def merge(cls, segments, vocab_size):
+        """Combine the live rows of segments into one, re-sorting postings by term"""
+        terms, rows, tf, live = [], [], [], []
+        offset = 0
+        for seg in segments:
+            seg_live = np.ones(len(seg.doc_ids), dtype=bool) if seg.dead is None else ~seg.dead
+            # Row of each live document in the merged segment
+            new_rows = np.cumsum(seg_live) - 1 + offset
+            kept = seg_live[seg.doc_idx]
+            terms.append(np.repeat(np.arange(len(seg.term_ptr) - 1), np.diff(seg.term_ptr))[kept])
+            rows.append(new_rows[seg.doc_idx[kept]])
+            tf.append(seg.tf[kept])
+            live.append(seg_live)
+            offset += int(seg_live.sum())
+        terms = np.concatenate(terms)
+
+        order = np.argsort(terms, kind='stable')
+        term_ptr = np.zeros(vocab_size + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=vocab_size), out=term_ptr[1:])
+
+        return cls(term_ptr, np.concatenate(rows)[order].astype(np.int32), np.concatenate(tf)[order],
+                   np.concatenate([seg.doc_ids[mask] for seg, mask in zip(segments, live)]),
+                   np.concatenate([seg.doc_lens[mask] for seg, mask in zip(segments, live)]),
+                   np.concatenate([seg.doc_versions[mask] for seg, mask in zip(segments, live)]))
+
+    @classmethod
+    def load(cls, path, name):
+        """Open a saved segment; arrays are memory-mapped, not read into RAM"""
+        arrays = {}
+        for array in cls.ARRAYS:
+            array_path = os.path.join(path, f'{array}.npy')
+            if os.path.exists(array_path):
+                arrays[array] = np.load(array_path, mmap_mode='r')
+        # Segments written before versions were recorded hold first texts
+        arrays.setdefault('doc_versions', np.zeros(len(arrays['doc_ids']), dtype=np.int64))
+        return cls(**arrays, name=name)
+
+    def save(self, path):
+        os.makedirs(path)
+        for array in self.ARRAYS:
+            np.save(os.path.join(path, f'{array}.npy'), getattr(self, array))
+
+    def document_frequencies(self, vocab_size):
+        """Live documents containing each term"""
+        df = np.zeros(vocab_size, dtype=np.int64)
+        counts = np.diff(self.term_ptr)
+        if self.dead is not None:
+            dead_terms = np.repeat(np.arange(len(counts)), counts)[self.dead[self.doc_idx]]
+            counts = counts - np.bincount(dead_terms, minlength=len(counts))
+        df[:len(counts)] = counts
+        return df
+
+    def total_length(self):
+        """Total length of the live documents"""
+        lengths = self.doc_lens if self.dead is None else self.doc_lens[~self.dead]
+        return int(lengths.sum())
+
+    def live_count(self):
+        return len(self.doc_ids) if self.dead is None else int(len(self.doc_ids) - self.dead.sum())
+
+    def tier(self):
+        """Size tier: segments of one tier are within MERGE_FACTOR times of each other"""
+        return max(0, int(math.log(max(self.live_count(), 1) / SEGMENT_SIZE, MERGE_FACTOR)))
+
+class MatchIndex:
+    """BM25 index over extracted CV text for ranking CVs against a job description.
+
+    The index is a list of immutable on-disk segments plus an in-memory buffer
+    of recent CVs. It is derived data: anything missing from disk is rebuilt
+    from cv_texts by refresh().
+
+    Requests only add CVs to the buffer. A background thread per process
+    builds the index on first use, unless build() already did, and writes
+    the buffer as segments and merges them; queries read the old segments
+    until a merge is done."""
+
+    def __init__(self, directory=MATCH_INDEX_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Held for a whole refresh, which reads the database outside self.lock
+        self.refresh_lock = threading.Lock()
+        self.built = threading.Event()
+        self.write_needed = threading.Event()
+        self.writer_pid = None
+        self.vocab = {}
+        self.df = np.zeros(0, dtype=np.int64)
+        self.segments = []
+        self.pending = []
+        self.pending_segment = None
+        self.indexed = set()
+        self.total_docs = 0
+        self.total_length = 0
+        self.cursor = RefreshCursor()
+        # Lowest CV id lost to another writer, indexed again by the next refresh
+        self.rewind = None
+        # (mtime, size) of the manifest this process last read or wrote
+        self.manifest_stamp = None
+        self.load()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the lock that lets one process at a time write the directory"""
+        with open(os.path.join(self.directory, 'lock'), 'a+b') as file:
+            if fcntl:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+                else:
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def load(self):
+        """Memory-map the segments listed in the manifest and delete unlisted ones"""
+        with self._locked():
+            manifest = self._read_manifest()
+            if manifest is not None:
+                self._adopt(manifest)
+
+            # Leftovers of merges whose old segments were still open elsewhere,
+            # and of writers that died before updating the manifest
+            listed = set(manifest['segments']) if manifest else set()
+            for name in os.listdir(self.directory):
+                if name.startswith('segment-') and name not in listed:
+                    shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+                elif name.startswith('manifest.') and name.endswith('.tmp'):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _manifest_stamp(self):
+        try:
+            stat = os.stat(os.path.join(self.directory, 'manifest.json'))
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_manifest(self):
+        """Return the manifest on disk, or None when there is none yet"""
+        try:
+            with open(os.path.join(self.directory, 'manifest.json'), encoding='utf-8') as file:
+                manifest = json.load(file)
+        except FileNotFoundError:
+            return None
+        self.manifest_stamp = self._manifest_stamp()
+        return manifest
+
+    def _adopt(self, manifest):
+        """Switch to the segments and vocabulary of a manifest.
+
+        Another process may have written it: terms this process added since
+        are numbered after the manifest's, buffered CVs that a listed segment
+        holds in the same or a newer version are dropped, and CVs of unlisted
+        segments are indexed again."""
+        vocab = {term: term_id for term_id, term in enumerate(manifest['vocab'])}
+        new_ids = np.zeros(len(self.vocab), dtype=np.int64)
+        for term, term_id in self.vocab.items():
+            new_ids[term_id] = vocab.setdefault(term, len(vocab))
+
+        opened = {segment.name: segment for segment in self.segments}
+        segments = []
+        for name in manifest['segments']:
+            path = os.path.join(self.directory, name)
+            if name in opened:
+                segments.append(opened[name])
+            # A segment lost to a concurrent writer is simply re-indexed by refresh()
+            elif os.path.isdir(path):
+                segments.append(Segment.load(path, name))
+
+        stored = set()
+        stored_versions = {}
+        pending_ids = np.array([cv_id for cv_id, _, _, _ in self.pending], dtype=np.int64)
+        for segment in segments:
+            stored.update(segment.doc_ids.tolist())
+            held = np.isin(segment.doc_ids, pending_ids)
+            for cv_id, version in zip(segment.doc_ids[held].tolist(), segment.doc_versions[held].tolist()):
+                stored_versions[cv_id] = max(version, stored_versions.get(cv_id, version))
+        pending = [(cv_id, {int(new_ids[term_id]): count for term_id, count in counts.items()}, length, version)
+                   for cv_id, counts, length, version in self.pending
+                   if version > stored_versions.get(cv_id, -1)]
+        indexed = stored | {cv_id for cv_id, _, _, _ in pending}
+        lost = self.indexed - indexed
+        if lost:
+            self.rewind = min(lost) if self.rewind is None else min(self.rewind, min(lost))
+
+        self.vocab = vocab
+        self.segments = segments
+        self.pending = pending
+        self.indexed = indexed
+        self._recount()
+
+    def _recount(self):
+        """Mark superseded rows dead and recompute the BM25 statistics.
+
+        The newest version of a CV wins, then the newest segment; buffered CVs
+        are always the newest."""
+        pending_ids = {cv_id for cv_id, _, _, _ in self.pending}
+        if self.segments:
+            ids = np.concatenate([segment.doc_ids for segment in self.segments])
+            versions = np.concatenate([segment.doc_versions for segment in self.segments])
+            order = np.lexsort((np.arange(len(ids)), versions, ids))
+            newest = np.ones(len(ids), dtype=bool)
+            newest[order[:-1]] = ids[order[:-1]] != ids[order[1:]]
+            newest &= ~np.isin(ids, np.fromiter(pending_ids, dtype=np.int64, count=len(pending_ids)))
+            start = 0
+            for segment in self.segments:
+                live = newest[start:start + len(segment.doc_ids)]
+                segment.dead = None if live.all() else ~live
+                start += len(segment.doc_ids)
+
+        self.pending_segment = None
+        self.df = np.zeros(len(self.vocab), dtype=np.int64)
+        self.total_length = 0
+        for segment in self.segments:
+            self.df += segment.document_frequencies(len(self.vocab))
+            self.total_length += segment.total_length()
+        for _, counts, length, _ in self.pending:
+            self.df[list(counts)] += 1
+            self.total_length += length
+        self.total_docs = len(self.indexed)
+
+    def refresh(self, conn):
+        """Index every CV whose text was stored since the last refresh, and the
+        new text of every re-extracted one.
+
+        Until the background thread has built the index this returns at once,
+        so no request waits for the whole corpus to be read."""
+        self._start_writer()
+        if not self.built.is_set():
+            return
+        with self.refresh_lock:
+            self._refresh(conn)
+        if len(self.pending) >= SEGMENT_SIZE:
+            self.write_needed.set()
+
+    def build(self, conn):
+        """Index every stored CV and write the segments on this thread"""
+        with self.refresh_lock:
+            self._refresh(conn, write=True)
+        self.built.set()
+
+    def _refresh(self, conn, write=False):
+        # Texts are read and tokenized outside self.lock, so queries carry on
+        with self.lock:
+            if self.rewind is not None:
+                self.cursor.watermark = min(self.cursor.watermark, self.rewind - 1)
+                self.rewind = None
+        updated = self.cursor.updated(conn, lambda cv_id: cv_id in self.indexed, text_changed=True)
+        ids = list(updated)
+        for start in range(0, len(ids), SEGMENT_SIZE):
+            chunk = ids[start:start + SEGMENT_SIZE]
+            placeholders = ', '.join('?' * len(chunk))
+            docs = [(cv_id, tokenize(decompress_text(text))) for cv_id, text in
+                    conn.execute(f"SELECT cv_id, text FROM cv_texts WHERE cv_id IN ({placeholders})", chunk)]
+            with self.lock:
+                for cv_id, tokens in docs:
+                    self._add(cv_id, tokens, updated[cv_id])
+                self._recount()
+            if write:
+                self._write()
+
+        # Ids first: after load() most CVs past the watermark are already indexed
+        sql = "SELECT cv_id FROM cv_texts WHERE cv_id > ? ORDER BY cv_id"
+        for rows in self.cursor.new_rows(conn, sql, SEGMENT_SIZE):
+            new_ids = [cv_id for cv_id, in rows if cv_id not in self.indexed]
+            if new_ids:
+                placeholders = ', '.join('?' * len(new_ids))
+                docs = [(cv_id, tokenize(decompress_text(text))) for cv_id, text in
+                        conn.execute(f"SELECT cv_id, text FROM cv_texts WHERE cv_id IN ({placeholders})", new_ids)]
+                with self.lock:
+                    for cv_id, tokens in docs:
+                        self._add(cv_id, tokens)
+                if write:
+                    self._write()
+
+    def _add(self, cv_id, tokens, version=0):
+        if cv_id in self.indexed:
+            # A re-extracted CV: the buffered copy is replaced, and _recount()
+            # retires the one in a segment and fixes the statistics
+            self.pending = [doc for doc in self.pending if doc[0] != cv_id]
+        counts = {}
+        for term, count in Counter(tokens).items():
+            term_id = self.vocab.setdefault(term, len(self.vocab))
+            counts[term_id] = count
+
+        if len(self.vocab) > len(self.df):
+            self.df = np.concatenate([self.df, np.zeros(max(len(self.vocab) - len(self.df), 1024), dtype=np.int64)])
+        self.df[list(counts)] += 1
+
+        self.pending.append((cv_id, counts, len(tokens), version))
+        self.pending_segment = None
+        self.indexed.add(cv_id)
+        self.total_docs = len(self.indexed)
+        self.total_length += len(tokens)
+
+    def _start_writer(self):
+        """Start the background thread of this process on first use"""
+        with self.lock:
+            if self.writer_pid == os.getpid():
+                return
+            self.writer_pid = os.getpid()
+        threading.Thread(target=self._write_loop, name='match-index-writer', daemon=True).start()
+
+    def _write_loop(self):
+        conn = connect()
+        while not self.built.is_set():
+            try:
+                self.build(conn)
+            except Exception:
+                log.exception('Building the match index failed')
+                time.sleep(5)
+        while True:
+            self.write_needed.wait()
+            self.write_needed.clear()
+            try:
+                self._write()
+            except Exception:
+                log.exception('Writing the match index failed')
+                time.sleep(5)
+                self.write_needed.set()
+
+    def _write(self):
+        """Write buffered CVs as a new segment once there are enough of them,
+        update the manifest and merge segments.
+
+        Every process serving the app writes to the same directory, so this
+        holds the directory lock and first catches up with the manifest."""
+        if len(self.pending) < SEGMENT_SIZE:
+            return
+        with self._locked():
+            with self.lock:
+                if self._manifest_stamp() != self.manifest_stamp:
+                    self._adopt(self._read_manifest() or {'segments': [], 'vocab': []})
+                if len(self.pending) < SEGMENT_SIZE:
+                    # Another process already wrote the buffered CVs
+                    return
+                self.segments.append(self._save(Segment.build(self.pending, len(self.vocab))))
+                self.pending = []
+                self.pending_segment = None
+                self._write_manifest()
+
+            while self._merge():
+                pass
+
+    def _merge(self):
+        """Merge the oldest run of MERGE_FACTOR adjacent segments of one size
+        tier, if there is one; returns whether there was.
+
+        Only this thread changes the segment list. The merged segment is
+        written without holding self.lock, so queries read the old segments
+        until it replaces them."""
+        with self.lock:
+            tiers = [segment.tier() for segment in self.segments]
+            for start in range(len(self.segments) - MERGE_FACTOR + 1):
+                run = self.segments[start:start + MERGE_FACTOR]
+                if (len(set(tiers[start:start + MERGE_FACTOR])) == 1
+                        and sum(segment.live_count() for segment in run) <= MAX_MERGED_SIZE):
+                    break
+            else:
+                return False
+            vocab_size = len(self.vocab)
+
+        # Rows that die meanwhile are marked in the merged segment by _recount()
+        merged = self._save(Segment.merge(run, vocab_size))
+        with self.lock:
+            self.segments[start:start + MERGE_FACTOR] = [merged]
+            self._recount()
+            self._write_manifest()
+        # Processes still reading the old segments keep them open until they
+        # catch up; load() deletes any the OS would not remove
+        for segment in run:
+            shutil.rmtree(os.path.join(self.directory, segment.name), ignore_errors=True)
+        return True
+
+    def _save(self, segment):
+        """Write a segment under a unique name and reopen it memory-mapped"""
+        name = f'segment-{uuid.uuid4().hex}'
+        path = os.path.join(self.directory, name)
+        segment.save(path)
+        return Segment.load(path, name)
+
+    def _write_manifest(self):
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = os.path.join(self.directory, f'manifest.{uuid.uuid4().hex}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'segments': [segment.name for segment in self.segments], 'vocab': vocab}, file)
+        os.replace(tmp_path, os.path.join(self.directory, 'manifest.json'))
+        self.manifest_stamp = self._manifest_stamp()
+
+    def search(self, text, limit=10):
+        """Return [(cv_id, bm25_score)] for the best matches to text, best first"""
+        with self.lock:
+            if self.pending and self.pending_segment is None:
+                self.pending_segment = Segment.build(self.pending, len(self.vocab))
+            segments = self.segments + ([self.pending_segment] if self.pending else [])
+            query = [(self.vocab[term], count) for term, count in Counter(tokenize(text)).items()
+                     if term in self.vocab]
+            total_docs, total_length = self.total_docs, self.total_length
+            df = self.df[[term_id for term_id, _ in query]] if query else np.zeros(0)
+
+        if not query or not total_docs:
+            return []
+
+        term_ids = np.array([term_id for term_id, _ in query])
+        query_tf = np.array([count for _, count in query], dtype=np.float64)
+        idf = np.log(1 + (total_docs - df + 0.5) / (df + 0.5))
+        weights = idf * query_tf * (BM25_K1 + 1) / (query_tf + BM25_K1)
+        avg_length = total_length / total_docs
+
+        candidates = []
+        for segment in segments:
+            # Gather the postings of every query term in the segment at once
+            known = term_ids < len(segment.term_ptr) - 1
+            starts = segment.term_ptr[term_ids[known]]
+            ends = segment.term_ptr[term_ids[known] + 1]
+            lengths = ends - starts
+            if not lengths.sum():
+                continue
+
+            positions = np.concatenate([np.arange(s, e) for s, e in zip(starts, ends)])
+            docs = segment.doc_idx[positions]
+            tf = segment.tf[positions]
+            term_weight = np.repeat(weights[known], lengths)
+
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * segment.doc_lens[docs] / avg_length)
+            scores = np.bincount(docs, weights=term_weight * tf * (BM25_K1 + 1) / (tf + norm),
+                                 minlength=len(segment.doc_ids))
+            if segment.dead is not None:
+                scores[segment.dead] = 0
+
+            k = min(limit, int(np.count_nonzero(scores)))
+            if k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                candidates.extend(zip(segment.doc_ids[top].tolist(), scores[top].tolist()))
+
+        candidates.sort(key=lambda item: item[1], reverse=True)
+        return candidates[:limit]
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_match_index(directory=MATCH_INDEX_DIR):
+    """Return the process-wide match index, opening it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            os.makedirs(directory, exist_ok=True)
+            _index = MatchIndex(directory)
+        return _index
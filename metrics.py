@@ -0,0 +1,206 @@
+import bisect
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+# Instrumentation is installed by enable(); until then nothing is wrapped,
+# so a disabled build runs exactly the uninstrumented code
+enabled = False
+
+# Upper bounds in seconds, from 100µs up to 10s
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+request_log = logging.getLogger('cv_platform.requests')
+
+# Per-request counters ({'endpoint', 'db_seconds', 'db_queries'}) for the current request
+current_request = ContextVar('current_request', default=None)
+
+class Histogram:
+    """Prometheus-style histogram with one series per label combination"""
+
+    def __init__(self, name, documentation, labelnames, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        # {label values: [bucket counts..., +Inf count, sum]}
+        self.series = {}
+
+    def observe(self, labels, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: list(values) for labels, values in self.series.items()}
+
+        for labels, values in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += values[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{label_text}}} {values[-1]}')
+            lines.append(f'{self.name}_count{{{label_text}}} {cumulative}')
+        return '\n'.join(lines)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+analyzer_seconds = Histogram('cv_analyzer_stage_seconds',
+                             'Time spent in each CV analysis stage', ('stage',))
+db_seconds = Histogram('cv_db_seconds',
+                       'Time spent in SQLite calls, by endpoint and statement type', ('endpoint', 'operation'))
+request_seconds = Histogram('cv_request_seconds',
+                            'HTTP request latency', ('endpoint', 'method', 'status'))
+HISTOGRAMS = [analyzer_seconds, db_seconds, request_seconds]
+
+def render():
+    """Return every metric in the Prometheus text exposition format"""
+    return '\n'.join(histogram.render() for histogram in HISTOGRAMS) + '\n'
+
+def enable():
+    global enabled
+    enabled = True
+    # Request log lines are single JSON objects on stderr unless the
+    # deployment configures its own handler
+    if not request_log.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        request_log.addHandler(handler)
+        request_log.setLevel(logging.INFO)
+        request_log.propagate = False
+
+# --- CVAnalyzer stages ---
+
+ANALYZER_STAGES = {
+    'update_contact_info': 'contact',
+    'update_skills': 'skills',
+    'update_experience': 'experience',
+    'calculate_score': 'score',
+    'generate_recommendations': 'recommendations',
+}
+
+def _timed(func, histogram, labels):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            histogram.observe(labels, time.perf_counter() - started)
+    return wrapper
+
+def _timed_pages(func):
+    """Time the extraction of each page yielded by iter_pdf_pages"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        pages = func(*args, **kwargs)
+        while True:
+            started = time.perf_counter()
+            try:
+                page = next(pages)
+            except StopIteration:
+                return
+            analyzer_seconds.observe(('extract',), time.perf_counter() - started)
+            yield page
+    return wrapper
+
+def instrument_analyzer(analyzer):
+    """Time the stages of one CVAnalyzer instance"""
+    for method, stage in ANALYZER_STAGES.items():
+        setattr(analyzer, method, _timed(getattr(analyzer, method), analyzer_seconds, (stage,)))
+    analyzer.iter_pdf_pages = _timed_pages(analyzer.iter_pdf_pages)
+    analyzer.analyze_text = _timed(analyzer.analyze_text, analyzer_seconds, ('total',))
+    return analyzer
+
+# --- SQLite calls ---
+
+def _record_query(sql, seconds):
+    request = current_request.get()
+    endpoint = request['endpoint'] if request else 'background'
+    operation = sql.lstrip().split(None, 1)[0].lower() if sql.strip() else 'other'
+    db_seconds.observe((endpoint, operation), seconds)
+    if request:
+        request['db_seconds'] += seconds
+        request['db_queries'] += 1
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _record_query(sql, time.perf_counter() - started)
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements and commits are recorded in cv_db_seconds"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _record_query('COMMIT', time.perf_counter() - started)
+
+def connection_factory():
+    return TimedConnection if enabled else sqlite3.Connection
+
+# --- Requests ---
+
+def start_request(endpoint):
+    """Begin per-request accounting; returns the token for finish_request"""
+    state = {'endpoint': endpoint or 'unknown', 'db_seconds': 0.0, 'db_queries': 0,
+             'started': time.perf_counter()}
+    return current_request.set(state)
+
+def finish_request(token, method, path, status):
+    """Record the request's latency and write its structured log line"""
+    state = current_request.get()
+    current_request.reset(token)
+    if state is None:
+        return
+
+    seconds = time.perf_counter() - state['started']
+    request_seconds.observe((state['endpoint'], method, str(status)), seconds)
+    request_log.info(json.dumps({
+        'event': 'request',
+        'method': method,
+        'path': path,
+        'endpoint': state['endpoint'],
+        'status': status,
+        'duration_ms': round(seconds * 1000, 3),
+        'db_ms': round(state['db_seconds'] * 1000, 3),
+        'db_queries': state['db_queries'],
+    }))
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Smart CV Management Platform - Re-analysis
+Bring stored analyses up to the current analyzer version.
+
+Usage: python reanalyze.py [--chunk-size 100] [--rate 20] [--pause 1]
+
+Only CVs analyzed by an older analyzer version are processed, in id order and
+one short transaction per chunk. Progress is checkpointed with every chunk,
+so an interrupted run resumes where it stopped (--restart starts over and
+retries CVs that failed). Stored text is re-scored without opening the PDF
+unless text extraction changed since the CV was analyzed (TEXT_VERSION) or
+the CV predates analyzer versions.
+"""
+
+import argparse
+import json
+import os
+import time
+
+from analyzer import ANALYZER_VERSION, TEXT_VERSION, get_analyzer
+from database import connect, init_db, replace_analysis, cache_analysis, decompress_text
+
+def load_checkpoint(conn):
+    row = conn.execute("SELECT last_cv_id FROM reanalysis_checkpoints WHERE analyzer_version = ?",
+                       (ANALYZER_VERSION,)).fetchone()
+    return row[0] if row else 0
+
+def save_checkpoint(c, last_cv_id):
+    c.execute("""INSERT OR REPLACE INTO reanalysis_checkpoints (analyzer_version, last_cv_id, updated_at)
+                 VALUES (?, ?, CURRENT_TIMESTAMP)""", (ANALYZER_VERSION, last_cv_id))
+
+def count_stale(conn, after=0):
+    return conn.execute("""SELECT COUNT(*) FROM cvs
+                           WHERE id > ? AND analysis_result IS NOT NULL
+                             AND (analyzer_version IS NULL OR analyzer_version < ?)""",
+                        (after, ANALYZER_VERSION)).fetchone()[0]
+
+def fetch_stale(conn, after, limit):
+    """Next CVs after id `after` whose analysis predates ANALYZER_VERSION"""
+    return conn.execute("""SELECT cvs.id, cvs.filename, cvs.analysis_result, cvs.analyzer_version,
+                                  cvs.content_hash, cv_texts.text
+                           FROM cvs
+                           LEFT JOIN cv_texts ON cv_texts.cv_id = cvs.id
+                           WHERE cvs.id > ? AND cvs.analysis_result IS NOT NULL
+                             AND (cvs.analyzer_version IS NULL OR cvs.analyzer_version < ?)
+                           ORDER BY cvs.id
+                           LIMIT ?""", (after, ANALYZER_VERSION, limit)).fetchall()
+
+def rescore(analyzer, text, page_count):
+    """Analyze stored text, which is kept as one string: the page count of the
+    stored analysis is kept instead of the single page this would report"""
+    analysis = analyzer.analyze_text([text])
+    if page_count is not None:
+        analysis['page_count'] = page_count
+    return analysis
+
+def reanalyze(analyzer, version, filename, text, page_count, upload_folder, reextract=False):
+    """Return (analysis, whether the stored text was reused).
+
+    Rows from before versions were recorded (version None) may hold text from
+    any older extractor, so their PDFs are re-read like those of stale versions."""
+    stale_text = version is None or version < TEXT_VERSION
+    if text is not None and not (stale_text or reextract):
+        return rescore(analyzer, text, page_count), True
+
+    path = os.path.join(upload_folder, filename)
+    if os.path.exists(path):
+        return analyzer.analyze_cv(path), False
+    if text is not None:
+        # The PDF is gone; its stored text is the best there is
+        return rescore(analyzer, text, page_count), True
+    raise FileNotFoundError(f'{path} is missing and no text is stored')
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-analyze CVs stored by an older analyzer version')
+    parser.add_argument('--chunk-size', type=int, default=100,
+                        help='CVs written per database transaction (default: 100)')
+    parser.add_argument('--rate', type=float, default=0,
+                        help='Maximum CVs per second, 0 for no limit (default: 0)')
+    parser.add_argument('--pause', type=float, default=0,
+                        help='Seconds to sleep between chunks (default: 0)')
+    parser.add_argument('--nice', type=int, default=10,
+                        help='CPU niceness increment, where supported (default: 10)')
+    parser.add_argument('--upload-folder', default='uploads',
+                        help='Where uploaded PDFs are stored (default: uploads)')
+    parser.add_argument('--reextract', action='store_true',
+                        help='Re-read every PDF instead of reusing stored text')
+    parser.add_argument('--restart', action='store_true',
+                        help='Ignore the checkpoint and retry CVs that failed')
+    args = parser.parse_args()
+
+    if args.nice and hasattr(os, 'nice'):
+        os.nice(args.nice)
+
+    init_db()
+    conn = connect()
+    analyzer = get_analyzer()
+
+    if args.restart:
+        conn.execute("DELETE FROM reanalysis_checkpoints WHERE analyzer_version = ?", (ANALYZER_VERSION,))
+        conn.commit()
+    last_cv_id = load_checkpoint(conn)
+    total = count_stale(conn, last_cv_id)
+
+    print("=" * 70)
+    print(f"🔄 {total} CV(s) to bring up to analyzer version {ANALYZER_VERSION}")
+    if last_cv_id:
+        print(f"⏯️  Resuming after CV {last_cv_id}")
+    print("=" * 70)
+
+    done = failed = reused = 0
+    started = time.monotonic()
+
+    while True:
+        rows = fetch_stale(conn, last_cv_id, args.chunk_size)
+        if not rows:
+            break
+
+        # Analyze outside any transaction; only the writes below hold the lock
+        results = []
+        for cv_id, filename, analysis_result, version, content_hash, blob in rows:
+            text = decompress_text(blob) if blob is not None else None
+            old_analysis = json.loads(analysis_result)
+            try:
+                analysis, text_reused = reanalyze(analyzer, version, filename, text, old_analysis.get('page_count'),
+                                                  args.upload_folder, args.reextract)
+            except Exception as e:
+                failed += 1
+                print(f"❌ CV {cv_id}: {e}")
+            else:
+                results.append((cv_id, analysis, old_analysis, text or '', content_hash))
+                reused += text_reused
+
+            done += 1
+            if args.rate > 0:
+                # Sleep off any lead over the allowed rate
+                ahead = done / args.rate - (time.monotonic() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        for cv_id, analysis, old_analysis, old_text, content_hash in results:
+            replace_analysis(c, cv_id, analysis, old_analysis, old_text)
+            if content_hash:
+                cache_analysis(c, content_hash, analysis)
+        last_cv_id = rows[-1][0]
+        save_checkpoint(c, last_cv_id)
+        conn.commit()
+
+        elapsed = max(time.monotonic() - started, 1e-9)
+        print(f"🔄 {done}/{total} CVs | {done / elapsed:.1f} CVs/s | "
+              f"{reused} from stored text | {failed} failed")
+        if args.pause:
+            time.sleep(args.pause)
+
+    conn.close()
+    print("✅ Re-analysis finished")
+
+if __name__ == '__main__':
+    main()
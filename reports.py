@@ -0,0 +1,62 @@
+import glob
+import hashlib
+import os
+import uuid
+
+from responses import ENCODINGS, compress
+
+REPORT_CACHE_FOLDER = 'report_cache'
+
+# Bump when templates/report.html changes, so cached reports are re-rendered
+REPORT_TEMPLATE_VERSION = 1
+
+def report_version(analysis_result):
+    """Version of a CV's report: changes whenever its analysis or the template does"""
+    digest = hashlib.sha256(analysis_result.encode('utf-8'))
+    digest.update(str(REPORT_TEMPLATE_VERSION).encode())
+    return digest.hexdigest()[:20]
+
+class ReportCache:
+    """Rendered reports on disk, one file per (cv id, version) and encoding.
+
+    Files are written once, atomically, and never modified; a new version of
+    a report replaces the files of the old one."""
+
+    def __init__(self, folder=REPORT_CACHE_FOLDER):
+        self.folder = folder
+
+    def path(self, cv_id, version, encoding=None):
+        suffix = ENCODINGS[encoding] if encoding else ''
+        return os.path.join(self.folder, f'{cv_id}-{version}.html{suffix}')
+
+    def get(self, cv_id, version, encoding=None):
+        """Return the cached report bytes, or None if it was never rendered"""
+        try:
+            with open(self.path(cv_id, version, encoding), 'rb') as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def store(self, cv_id, version, html):
+        """Save a freshly rendered report in every encoding"""
+        os.makedirs(self.folder, exist_ok=True)
+        body = html.encode('utf-8')
+        # Reports are compressed once, so they get the slowest, smallest settings
+        variants = {None: body}
+        for encoding in ENCODINGS:
+            variants[encoding] = compress(body, encoding, level=11 if encoding == 'br' else 9)
+
+        # Drop earlier versions of this CV's report
+        for stale in glob.glob(os.path.join(self.folder, f'{cv_id}-*.html*')):
+            if not os.path.basename(stale).startswith(f'{cv_id}-{version}.'):
+                try:
+                    os.remove(stale)
+                except FileNotFoundError:
+                    pass
+
+        for encoding, data in variants.items():
+            tmp_path = os.path.join(self.folder, f'.{uuid.uuid4().hex}.tmp')
+            with open(tmp_path, 'wb') as file:
+                file.write(data)
+            os.replace(tmp_path, self.path(cv_id, version, encoding))
+        return variants
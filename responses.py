@@ -0,0 +1,109 @@
+import gzip
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import brotli
+except ImportError:  # Optional: responses are then offered gzip-compressed only
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # Optional: the standard json module is used instead
+    orjson = None
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = {'br': '.br', 'gzip': '.gz'} if brotli else {'gzip': '.gz'}
+
+# Bodies smaller than this are sent as they are; compressing them costs
+# more than the bytes it saves
+COMPRESS_MIN_SIZE = 1024
+
+def choose_encoding(accept_encodings):
+    """Pick the best supported encoding the client accepts, or None for identity.
+
+    accept_encodings is a werkzeug MIMEAccept-style object (request.accept_encodings)."""
+    for encoding in ENCODINGS:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+def compress(data, encoding, level=None):
+    """Compress data for one of ENCODINGS; level None picks a per-request speed"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=4 if level is None else level)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=6 if level is None else level, mtime=0)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+def compress_response(response, accept_encodings, min_size=COMPRESS_MIN_SIZE):
+    """Compress a buffered JSON response in place when the client accepts it"""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or not response.is_json):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is a different byte sequence, so a validator set
+    # on the original can only stand for it as a weak ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def parse_fields(value):
+    """Turn a fields= value (comma-separated string or list) into a set of keys.
+
+    Returns None when no selection was made, meaning every field."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    fields = {str(field).strip() for field in value} - {''}
+    return fields or None
+
+def select_fields(obj, fields):
+    """Return obj with only the requested top-level keys"""
+    if fields is None:
+        return obj
+    return {key: value for key, value in obj.items() if key in fields}
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson, for apps where it is installed.
+
+    Output matches the default provider's, except that non-ASCII text is
+    written as UTF-8 rather than \\u escapes."""
+
+    def _options(self, sort_keys=False, indent=None):
+        # Datetimes go through Flask's default() so they keep the HTTP date format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._options(kwargs.get('sort_keys', self.sort_keys), kwargs.get('indent'))
+        return orjson.dumps(obj, default=kwargs.get('default', self.default), option=option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(self.sort_keys, indent))
+        return self._app.response_class(body + b'\n', mimetype=self.mimetype)
+
+def json_provider(app):
+    """The fastest JSON provider available for app"""
+    return OrjsonProvider(app) if orjson else DefaultJSONProvider(app)
@@ -2,15 +2,16 @@
 """
 Smart CV Management Platform
 Run this file to start the server accessible from any network
+
+Usage: python run.py [--port 5000] [--server dev|gunicorn|waitress] [--workers 4] [--threads 4]
 """
 
-from app import app
+import argparse
 import os
 import socket
-import subprocess
 import sys
-import time
-import threading
+
+SERVERS = ['dev', 'gunicorn', 'waitress']
 
 def get_network_ip():
     """Get the actual network IP address"""
@@ -26,36 +27,90 @@ def get_network_ip():
         hostname = socket.gethostname()
         return socket.gethostbyname(hostname)
 
-def install_ngrok():
-    """Install ngrok if not present"""
-    try:
-        subprocess.run(["ngrok", "--version"], capture_output=True, check=True)
-        return True
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("📦 Installing ngrok for public access...")
-        try:
-            # Try to install ngrok via pip
-            subprocess.run([sys.executable, "-m", "pip", "install", "pyngrok"], check=True)
-            return True
-        except subprocess.CalledProcessError:
-            print("❌ Could not install ngrok automatically")
-            print("   Please install manually: pip install pyngrok")
-            return False
-
-def start_ngrok_tunnel():
-    """Start ngrok tunnel in background"""
+def start_ngrok_tunnel(port):
+    """Open a public tunnel if pyngrok is installed; never installs anything"""
     try:
         from pyngrok import ngrok
-        public_tunnel = ngrok.connect(5000)
+        public_tunnel = ngrok.connect(port)
         public_url = public_tunnel.public_url
         return public_url
     except ImportError:
+        print("⚠️  Public access needs pyngrok: pip install pyngrok")
         return None
     except Exception as e:
         print(f"⚠️  Could not create public tunnel: {e}")
         return None
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Start the Smart CV Management Platform')
+    parser.add_argument('--host', default='0.0.0.0', help='Interface to listen on (default: all)')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)),
+                        help='Port to listen on (default: 5000)')
+    parser.add_argument('--server', choices=SERVERS, default='dev',
+                        help='dev: Werkzeug development server; gunicorn: pre-forked worker '
+                             'processes (Linux/macOS); waitress: threaded, works on Windows')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes for gunicorn (default: number of CPUs)')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Request threads per worker process (default: 4)')
+    parser.add_argument('--keepalive', type=int, default=5,
+                        help='Seconds to keep idle HTTP connections open (default: 5)')
+    parser.add_argument('--timeout', type=int, default=120,
+                        help='Seconds before a stuck request is aborted (default: 120)')
+    parser.add_argument('--public', action='store_true',
+                        help='Also open a public ngrok tunnel (requires pyngrok)')
+    return parser.parse_args()
+
+def serve_gunicorn(app, args, on_worker_start):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit("❌ gunicorn is not installed: pip install gunicorn (or use --server waitress)")
+    
+    class PlatformApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f'{args.host}:{args.port}',
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'keepalive': args.keepalive,
+                'timeout': args.timeout,
+                'graceful_timeout': args.timeout,
+                # The app, its database migrations and the analyzer are loaded
+                # once here and shared copy-on-write by the forked workers
+                'preload_app': True,
+                'post_fork': lambda server, worker: on_worker_start(),
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    PlatformApplication().run()
+
+def serve_waitress(app, args):
+    try:
+        from waitress import serve
+    except ImportError:
+        sys.exit("❌ waitress is not installed: pip install waitress")
+    
+    # waitress runs one process; --workers does not apply
+    serve(app, host=args.host, port=args.port, threads=args.threads,
+          channel_timeout=args.timeout, connection_limit=max(100, args.threads * 25))
+
 if __name__ == '__main__':
+    args = parse_args()
+    
+    from app import create_app, start_analysis_workers, warm_up
+    
+    # Extraction workers are shared out between gunicorn's worker processes
+    app = create_app({'APP_PROCESSES': args.workers} if args.server == 'gunicorn' else None)
+    if args.server == 'gunicorn':
+        # Load the analyzer, PyPDF2 and the match index before any worker is forked
+        warm_up()
+    
     local_ip = get_network_ip()
     
     print("=" * 70)
@@ -63,14 +118,14 @@ if __name__ == '__main__':
     print("=" * 70)
     
     public_url = None
-    if install_ngrok():
+    if args.public:
         print("🌍 Creating public tunnel for global access...")
-        public_url = start_ngrok_tunnel()
+        public_url = start_ngrok_tunnel(args.port)
     
-    print(f"📍 Local access: http://localhost:5000")
-    print(f"📍 Local access: http://127.0.0.1:5000")
-    print(f"🌐 Network access: http://{local_ip}:5000")
-    print(f"📱 Mobile/Tablet access: http://{local_ip}:5000")
+    print(f"📍 Local access: http://localhost:{args.port}")
+    print(f"📍 Local access: http://127.0.0.1:{args.port}")
+    print(f"🌐 Network access: http://{local_ip}:{args.port}")
+    print(f"📱 Mobile/Tablet access: http://{local_ip}:{args.port}")
     
     if public_url:
         print("=" * 70)
@@ -79,42 +134,52 @@ if __name__ == '__main__':
         print("   ✅ Share this link with anyone, anywhere!")
         print("   ✅ Works on any phone, tablet, computer")
         print("   ✅ No need for same WiFi network")
-    else:
-        print("=" * 70)
-        print("⚠️  Public access not available (ngrok not installed)")
-        print("   Install with: pip install pyngrok")
     
     print("=" * 70)
     print("🔥 IMPORTANT: If you can't access from phone/other devices:")
-    print("   1. Make sure your firewall allows port 5000")
+    print(f"   1. Make sure your firewall allows port {args.port}")
     print("   2. Try disabling Windows Firewall temporarily")
-    print("   3. Use the PUBLIC URL above for global access")
+    print("   3. Use --public for a public URL")
     print("=" * 70)
+    if args.server == 'gunicorn':
+        print(f"⚙️  gunicorn: {args.workers} worker process(es) x {args.threads} thread(s)")
+    elif args.server == 'waitress':
+        print(f"⚙️  waitress: {args.threads} thread(s)")
+    else:
+        print("⚠️  Development server; use --server gunicorn or waitress in production")
     print("✅ Platform ready! Starting server...")
     print("🔄 Press Ctrl+C to stop the server")
     print("=" * 70)
     
-    # Run the app accessible from any network
     try:
-        app.run(
-            debug=False,        # Disabled debug for better network performance
-            host='0.0.0.0',     # Accept connections from any IP
-            port=5000,
-            threaded=True,      # Handle multiple requests simultaneously
-            use_reloader=False  # Prevent double startup in network mode
-        )
+        if args.server == 'gunicorn':
+            # Background threads do not survive fork, so every worker starts
+            # its own analysis threads for queued jobs and extraction workers
+            serve_gunicorn(app, args, start_analysis_workers)
+        else:
+            # Pick up any analysis jobs queued before the last shutdown, and
+            # start the extraction workers before the first upload
+            start_analysis_workers()
+            if args.server == 'waitress':
+                serve_waitress(app, args)
+            else:
+                app.run(
+                    debug=False,        # Disabled debug for better network performance
+                    host=args.host,     # Accept connections from any IP
+                    port=args.port,
+                    threaded=True,      # Handle multiple requests simultaneously
+                    use_reloader=False  # Prevent double startup in network mode
+                )
     except OSError as e:
         if "Address already in use" in str(e):
-            print("❌ ERROR: Port 5000 is already in use!")
+            print(f"❌ ERROR: Port {args.port} is already in use!")
             print("   Try: python run.py --port 8080")
-            print("   Or kill the process using port 5000")
+            print(f"   Or kill the process using port {args.port}")
         else:
             print(f"❌ ERROR: {e}")
             print("   Try running as administrator/sudo")
     except KeyboardInterrupt:
         print("\n🛑 Server stopped by user")
-        try:
+        if public_url:
             from pyngrok import ngrok
             ngrok.kill()
-        except:
-            pass
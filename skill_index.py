@@ -0,0 +1,145 @@
+import threading
+
+from database import RefreshCursor
+from skills import load_taxonomy
+
+def bitmap(ids):
+    """Return an int with bit i set for every i in ids"""
+    if not ids:
+        return 0
+    bits = bytearray((max(ids) >> 3) + 1)
+    for i in ids:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+def membership(bits):
+    """Return a function telling whether id i is in a bitmap.
+
+    Cheaper than (bits >> i) & 1 when many ids are tested, which copies the
+    whole bitmap each time."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+    return lambda i: (i >> 3) < len(data) and bool((data[i >> 3] >> (i & 7)) & 1)
+
+class SkillIndex:
+    """Bitmaps of searchable CV ids: one per skill and one per score.
+
+    Each bitmap is a Python int whose bit i is set when CV i belongs to it, so
+    filters are single &/| operations and counts are int.bit_count(). Like the
+    match index it is derived data, rebuilt from cv_skills by refresh()."""
+
+    def __init__(self, vocabulary=()):
+        self.lock = threading.Lock()
+        # Every taxonomy skill has a bitmap, so facets can report it at zero
+        self.skills = {skill.lower(): 0 for skill in vocabulary}
+        self.scores = {}
+        self.all = 0
+        self.cursor = RefreshCursor()
+
+    def refresh(self, conn):
+        """Add every CV analyzed since the last refresh and re-read re-analyzed ones"""
+        with self.lock:
+            updated = list(self.cursor.updated(conn, membership(self.all)))
+            if updated:
+                self._remove(updated)
+                for start in range(0, len(updated), 500):
+                    chunk = updated[start:start + 500]
+                    placeholders = ', '.join('?' * len(chunk))
+                    self._add_rows(conn.execute(self._select(f"cvs.id IN ({placeholders})"), chunk).fetchall())
+
+            for rows in self.cursor.new_rows(conn, self._select("cvs.id > ?"), chunk_size=10000):
+                is_indexed = membership(self.all)
+                self._add_rows([row for row in rows if not is_indexed(row[0])])
+
+    @staticmethod
+    def _select(condition):
+        return f"""SELECT cvs.id, cvs.score,
+                          (SELECT group_concat(skill, char(31)) FROM cv_skills
+                           WHERE cv_skills.cv_id = cvs.id)
+                   FROM cvs
+                   JOIN users ON cvs.user_id = users.id
+                   WHERE {condition} AND cvs.analysis_result IS NOT NULL
+                   ORDER BY cvs.id"""
+
+    def _add_rows(self, rows):
+        by_skill = {}
+        by_score = {}
+        for cv_id, score, skills in rows:
+            by_score.setdefault(score or 0, []).append(cv_id)
+            for skill in skills.split(chr(31)) if skills else ():
+                by_skill.setdefault(skill, []).append(cv_id)
+
+        # One |= per bitmap for the whole batch; each one copies the bitmap
+        for skill, ids in by_skill.items():
+            self.skills[skill] = self.skills.get(skill, 0) | bitmap(ids)
+        for score, ids in by_score.items():
+            self.scores[score] = self.scores.get(score, 0) | bitmap(ids)
+        self.all |= bitmap([row[0] for row in rows])
+
+    def _remove(self, cv_ids):
+        keep = ~bitmap(cv_ids)
+        self.skills = {skill: ids & keep for skill, ids in self.skills.items()}
+        self.scores = {score: ids & keep for score, ids in self.scores.items()}
+        self.all &= keep
+
+    def select(self, skills=(), match_all=False, min_score=0):
+        """Bitmap of the CVs with any (or all) of skills and a score >= min_score"""
+        with self.lock:
+            selected = self.all
+            if skills:
+                bitmaps = [self.skills.get(skill.lower(), 0) for skill in skills]
+                if match_all:
+                    for skill_bitmap in bitmaps:
+                        selected &= skill_bitmap
+                else:
+                    union = 0
+                    for skill_bitmap in bitmaps:
+                        union |= skill_bitmap
+                    selected &= union
+
+            if min_score > 0:
+                union = 0
+                for score, score_bitmap in self.scores.items():
+                    if score >= min_score:
+                        union |= score_bitmap
+                selected &= union
+            return selected
+
+    def facets(self, selected):
+        """Return [(skill, count)] for the skills of the selected CVs, most common first"""
+        with self.lock:
+            counts = [(skill, (skill_bitmap & selected).bit_count())
+                      for skill, skill_bitmap in self.skills.items()]
+        return sorted((item for item in counts if item[1]), key=lambda item: (-item[1], item[0]))
+
+    def top(self, selected, limit, after=None):
+        """Return up to limit (score, cv_id) pairs of selected CVs, best score first.
+
+        Ties are broken by descending id; after is the last (score, cv_id)
+        of the previous page."""
+        page = []
+        with self.lock:
+            scores = sorted(self.scores.items(), reverse=True)
+        for score, score_bitmap in scores:
+            if after and score > after[0]:
+                continue
+            ids = score_bitmap & selected
+            if after and score == after[0]:
+                ids &= (1 << after[1]) - 1
+            while ids and len(page) < limit:
+                cv_id = ids.bit_length() - 1
+                page.append((score, cv_id))
+                ids ^= 1 << cv_id
+            if len(page) >= limit:
+                break
+        return page
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_skill_index():
+    """Return the process-wide skill index, created empty on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SkillIndex(load_taxonomy())
+        return _index
@@ -0,0 +1,80 @@
+import json
+import os
+import re
+from functools import lru_cache
+
+TAXONOMY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'skills.json')
+
+# A skill must not be glued to surrounding letters, so "java" never matches
+# inside "javascript" and "excel" never matches inside "excellent"
+SKILL_PREFIX = r'(?<!\w)'
+SKILL_SUFFIX = r'(?![\w+#])'
+
+def _trie_pattern(node):
+    """Build a prefix-factored regex from a character trie"""
+    alternatives = []
+    for char in sorted(key for key in node if key):
+        # Spaces inside a skill match any run of whitespace (PDF line breaks)
+        step = r'\s+' if char == ' ' else re.escape(char)
+        alternatives.append(step + _trie_pattern(node[char]))
+    
+    is_end = '' in node
+    if not alternatives:
+        return ''
+    if len(alternatives) == 1 and not is_end:
+        return alternatives[0]
+    
+    group = '(?:' + '|'.join(alternatives) + ')'
+    return group + '?' if is_end else group
+
+class SkillMatcher:
+    """Find every taxonomy skill in a text with a single compiled regex"""
+    
+    def __init__(self, taxonomy):
+        # taxonomy maps each canonical skill name to a list of synonyms
+        self.skills = list(taxonomy)
+        self.aliases = {}
+        for skill, synonyms in taxonomy.items():
+            for alias in [skill] + list(synonyms):
+                self.aliases[' '.join(alias.lower().split())] = skill
+        
+        trie = {}
+        for alias in self.aliases:
+            node = trie
+            for char in alias:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        
+        source = SKILL_PREFIX + _trie_pattern(trie) + SKILL_SUFFIX
+        # Case-sensitive matching of lowercased text is several times faster
+        # than IGNORECASE, which is kept for text whose length lowercasing changes
+        self.lower_pattern = re.compile(source)
+        self.pattern = re.compile(source, re.IGNORECASE)
+    
+    def find(self, text):
+        """Yield (skill, start, end) for each match, left to right in one pass"""
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            matches = self.lower_pattern.finditer(lowered)
+        else:
+            matches = self.pattern.finditer(text)
+        for match in matches:
+            alias = ' '.join(match.group().lower().split())
+            yield self.aliases[alias], match.start(), match.end()
+    
+    def extract(self, text):
+        """Return the distinct skills in text, in order of first appearance"""
+        found = {}
+        for skill, start, end in self.find(text):
+            found.setdefault(skill, start)
+        return list(found)
+
+def load_taxonomy(path=TAXONOMY_PATH):
+    """Load {skill: [synonyms]} from a JSON file"""
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+@lru_cache(maxsize=None)
+def get_skill_matcher(path=TAXONOMY_PATH):
+    """Compile the matcher for a taxonomy file once per process"""
+    return SkillMatcher(load_taxonomy(path))
@@ -0,0 +1,35 @@
+import hashlib
+import os
+import tempfile
+
+class FileTooLarge(Exception):
+    pass
+
+def store_upload(stream, upload_folder, max_size=None):
+    """Save a binary stream under its SHA-256 digest and return (content_hash, filename)"""
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=upload_folder, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: stream.read(64 * 1024), b''):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise FileTooLarge(f'File is larger than {max_size // (1024 * 1024)}MB')
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    
+    content_hash = digest.hexdigest()
+    filename = content_hash + '.pdf'
+    file_path = os.path.join(upload_folder, filename)
+    
+    # Identical content is stored once, however many times it is uploaded
+    if os.path.exists(file_path):
+        os.remove(tmp_path)
+    else:
+        os.replace(tmp_path, file_path)
+    
+    return content_hash, filename